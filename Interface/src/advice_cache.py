@@ -0,0 +1,88 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+class AdviceCache:
+    """LRU + TTL cache of AI care advice in front of a durable store.
+
+    Advice is keyed by what the prompt depends on: plant name, location,
+    environment description and the current moisture rounded into a band, so
+    small sensor jitter reuses the cached answer while a real change in
+    conditions asks the model again. Misses in memory fall through to
+    ``loader(key)``, which returns ``(advice, age_seconds)`` or None, and new
+    advice is written through with ``storer(key, plant_id, advice)``.
+    """
+
+    def __init__(self, loader, storer, ttl_seconds=86400, max_entries=512, band_width=10):
+        self._loader = loader
+        self._storer = storer
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.band_width = band_width
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.store_hits = 0
+        self.misses = 0
+
+    def band(self, moisture):
+        if moisture is None:
+            return None
+        return int(float(moisture) // self.band_width)
+
+    def key(self, plant_data):
+        parts = [
+            (plant_data.get("name") or "").strip().lower(),
+            (plant_data.get("location") or "").strip().lower(),
+            (plant_data.get("environment_desc") or "").strip().lower(),
+            self.band(plant_data.get("last_moisture")),
+        ]
+        return hashlib.sha256(json.dumps(parts).encode()).hexdigest()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[1] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry:
+                del self._entries[key]
+
+        stored = self._loader(key)
+        if stored is None:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        advice, age = stored
+        with self._lock:
+            self.store_hits += 1
+            self._remember(key, advice, now + self.ttl_seconds - age)
+        return advice
+
+    def put(self, key, plant_id, advice):
+        self._storer(key, plant_id, advice)
+        with self._lock:
+            self._remember(key, advice, time.monotonic() + self.ttl_seconds)
+
+    def _remember(self, key, advice, expires):
+        self._entries[key] = (advice, expires)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "capacity": self.max_entries,
+                "hits": self.hits,
+                "store_hits": self.store_hits,
+                "misses": self.misses,
+                "ttl_seconds": self.ttl_seconds,
+            }
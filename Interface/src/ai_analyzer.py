@@ -1,29 +1,166 @@
 import os
-import json
 import logging
-import google.generativeai as genai
+import random
+import threading
+import time
+
+from Interface.src.ai_response import StreamingAdviceParser, parse_json_object, valid_fields
+
+ADVICE_KEYS = ("watering", "lighting", "fertilization", "other")
+
+
+class CircuitBreaker:
+    """Stops calling a failing dependency for a while instead of timing out on every request.
+
+    After ``failure_threshold`` consecutive failures the circuit opens and
+    ``allow()`` refuses calls for ``reset_seconds``. Then a single trial call
+    is let through (half-open); its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold=5, reset_seconds=60):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self.opened = 0
+        self.short_circuited = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.reset_seconds:
+                return "half-open"
+            return "open"
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at >= self.reset_seconds and not self._trial_running:
+                self._trial_running = True
+                return True
+            self.short_circuited += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_running or self._failures >= self.failure_threshold:
+                if self._opened_at is None or self._trial_running:
+                    self.opened += 1
+                self._opened_at = time.monotonic()
+            self._trial_running = False
+
 
 class PlantCareAIAnalyzer:
-    def __init__(self):
-        self.api_key = os.getenv("GEMINI_API_KEY")
+    """Long-lived Gemini client for plant care advice.
+
+    ``genai`` is imported, configured and the model handle built once per
+    process, on the first call rather than at construction. Each
+    call is bounded by ``timeout`` seconds and retried up to ``max_retries``
+    times with full-jitter backoff; repeated failures open a circuit breaker,
+    during which callers get ``_get_default_advice`` immediately.
+    """
+
+    def __init__(self, api_key=None, model_name=None, timeout=20.0, max_retries=2, backoff_seconds=1.0,
+                 failure_threshold=5, reset_seconds=60):
+        self.api_key = api_key or os.getenv("GEMINI_API_KEY")
+        self.model_name = model_name or os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.breaker = CircuitBreaker(failure_threshold, reset_seconds)
         self.logger = logging.getLogger(__name__)
+        self.model = None
 
-        if self.api_key:
-            genai.configure(api_key=self.api_key)
-            self.model = genai.GenerativeModel('gemini-pro')
-            self.logger.debug("Gemini AI initialized successfully.")
-        else:
-            self.logger.warning("GEMINI_API_KEY not found in environment.")
+        self.calls = 0
+        self.retries = 0
+        self.fallbacks = 0
+        self.partial_responses = 0
+
+        self._model_lock = threading.Lock()
 
-    def get_care_advice(self, plant_data):
         if not self.api_key:
-            return self._get_default_advice(plant_data)
+            self.logger.warning("GEMINI_API_KEY not found in environment.")
+
+    def _get_model(self):
+        """Configure genai and build the shared model handle on first use."""
+        if self.model is None and self.api_key:
+            with self._model_lock:
+                if self.model is None:
+                    import google.generativeai as genai
+
+                    genai.configure(api_key=self.api_key)
+                    self.model = genai.GenerativeModel(self.model_name)
+                    self.logger.debug("Gemini AI initialized successfully.")
+        return self.model
+
+    def _generate(self, prompt, on_chunk=None):
+        """One model round trip with per-call timeout, jittered retries and the circuit breaker.
+
+        With ``on_chunk`` the response is streamed and each text chunk passed
+        on as it arrives. A stream that breaks after delivering text is not
+        retried; the partial text is returned for the parser to salvage.
+        """
+        if not self.breaker.allow():
+            raise RuntimeError("Gemini circuit open; skipping call")
+
+        for attempt in range(self.max_retries + 1):
+            text = ""
+            try:
+                self.calls += 1
+                if on_chunk is None:
+                    response = self.model.generate_content(prompt, request_options={"timeout": self.timeout})
+                    text = response.text
+                else:
+                    stream = self.model.generate_content(prompt, stream=True,
+                                                         request_options={"timeout": self.timeout})
+                    for chunk in stream:
+                        text += chunk.text
+                        on_chunk(chunk.text)
+                self.breaker.record_success()
+                return text
+            except Exception as e:
+                if text:
+                    self.logger.warning(f"Gemini stream interrupted ({e}); using partial response")
+                    self.partial_responses += 1
+                    self.breaker.record_success()
+                    return text
+                if attempt == self.max_retries:
+                    self.breaker.record_failure()
+                    raise
+                self.retries += 1
+                delay = random.uniform(0, self.backoff_seconds * (2 ** attempt))
+                self.logger.warning(f"Gemini call failed ({e}); retrying in {delay:.2f}s")
+                time.sleep(delay)
+
+    def get_care_advice(self, plant_data, on_partial=None):
+        """``(advice, complete)``: a dict with the four ADVICE_KEYS and whether the model supplied all of them.
+
+        ``on_partial(fields)`` streams the response and reports each advice
+        field as soon as it is complete. Fields the model leaves out or breaks
+        are filled from ``_get_default_advice``; only a response with no usable
+        field at all falls back entirely. Anything filled in, wholly or in
+        part, comes back with ``complete`` False so callers don't cache it.
+        """
+        if not self._get_model():
+            return self._get_default_advice(plant_data), False
 
         try:
             # Detailed prompt for species-specific and long-form advice
             prompt = f"""
-            Act as an expert botanist and smart irrigation specialist. 
-            Provide a highly detailed, professional care analysis for a {plant_data['name']} (Species/Type) 
+            Act as an expert botanist and smart irrigation specialist.
+            Provide a highly detailed, professional care analysis for a {plant_data['name']} (Species/Type)
             located in {plant_data['location']} with the following environment: {plant_data.get('environment_desc')}.
 
             Current System Data:
@@ -34,20 +171,91 @@ class PlantCareAIAnalyzer:
             2. Provide 2-3 detailed paragraphs for EACH category.
             3. For 'watering', explain how the current moisture of {plant_data.get('last_moisture')}% relates to this specific plant's needs.
 
-            Return ONLY a JSON object with these keys: 
+            Return ONLY a JSON object with these keys:
             "watering", "lighting", "fertilization", "other".
             """
 
             self.logger.debug(f"Requesting detailed AI analysis for: {plant_data['name']}")
-            response = self.model.generate_content(prompt)
+            on_chunk = None
+            if on_partial:
+                parser = StreamingAdviceParser(ADVICE_KEYS)
+
+                def on_chunk(chunk):
+                    fields = parser.feed(chunk)
+                    if fields:
+                        on_partial(fields)
 
-            # Clean and parse
-            raw_text = response.text.strip().replace('```json', '').replace('```', '')
-            return json.loads(raw_text)
+            response_text = self._generate(prompt, on_chunk=on_chunk)
+
+            advice = valid_fields(parse_json_object(response_text, partial=True), ADVICE_KEYS)
+            if not advice:
+                raise ValueError("No advice fields found in model response")
+            complete = len(advice) == len(ADVICE_KEYS)
+            if not complete:
+                self.logger.warning(f"Model response missing {set(ADVICE_KEYS) - set(advice)}; using defaults")
+                advice = {**self._get_default_advice(plant_data), **advice}
+            return {key: advice[key] for key in ADVICE_KEYS}, complete
 
         except Exception as e:
             self.logger.error(f"Detailed Gemini API Error: {str(e)}")
-            return self._get_default_advice(plant_data)
+            self.fallbacks += 1
+            return self._get_default_advice(plant_data), False
+
+    def get_batch_care_advice(self, plants, max_per_call=10):
+        """Advice for many plants with one model call per ``max_per_call`` plants.
+
+        Returns ``({plant_id: advice}, complete_ids)`` covering every plant:
+        entries the model omits or returns malformed fall back to
+        ``_get_default_advice`` and are left out of ``complete_ids``.
+        """
+        results = {}
+        complete_ids = set()
+        for start in range(0, len(plants), max_per_call):
+            chunk = plants[start:start + max_per_call]
+            parsed = {}
+            if self._get_model():
+                try:
+                    parsed = self._request_batch(chunk)
+                except Exception as e:
+                    self.logger.error(f"Batch Gemini API Error: {str(e)}")
+                    self.fallbacks += 1
+
+            for plant in chunk:
+                advice = parsed.get(str(plant['id'])) if isinstance(parsed, dict) else None
+                if self._is_valid_advice(advice):
+                    results[plant['id']] = valid_fields(advice, ADVICE_KEYS)
+                    complete_ids.add(plant['id'])
+                else:
+                    results[plant['id']] = self._get_default_advice(plant)
+        return results, complete_ids
+
+    def _request_batch(self, plants):
+        plant_lines = "\n".join(
+            f"- id {plant['id']}: {plant['name']} located in {plant['location']}, "
+            f"environment: {plant.get('environment_desc')}, soil moisture: {plant.get('last_moisture', 'unknown')}%"
+            for plant in plants
+        )
+        prompt = f"""
+            Act as an expert botanist and smart irrigation specialist.
+            Provide a professional care analysis for each of the following plants,
+            specific to the biological needs of each species:
+
+            {plant_lines}
+
+            Requirements:
+            1. Provide 1-2 detailed paragraphs for EACH category of EACH plant.
+            2. For 'watering', explain how the plant's current moisture relates to its needs.
+
+            Return ONLY a JSON object keyed by plant id (as a string), where each value is an
+            object with these keys: "watering", "lighting", "fertilization", "other".
+            """
+
+        self.logger.debug(f"Requesting batch AI analysis for {len(plants)} plants")
+        return parse_json_object(self._generate(prompt), partial=True) or {}
+
+    @staticmethod
+    def _is_valid_advice(advice):
+        return len(valid_fields(advice, ADVICE_KEYS)) == len(ADVICE_KEYS)
 
     def _get_default_advice(self, plant_data):
         """Fallback advice to ensure UI remains functional"""
@@ -57,4 +265,18 @@ class PlantCareAIAnalyzer:
             "lighting": "Ensure plant receives adequate natural light based on its specific species needs.",
             "fertilization": "Use a balanced liquid fertilizer once a month during growing seasons.",
             "other": "Check leaves for dust or pests to maintain optimal plant health."
-        }
\ No newline at end of file
+        }
+
+    def stats(self):
+        return {
+            "model": self.model_name,
+            "configured": bool(self.api_key),
+            "model_loaded": self.model is not None,
+            "circuit": self.breaker.state,
+            "circuit_opened": self.breaker.opened,
+            "short_circuited": self.breaker.short_circuited,
+            "calls": self.calls,
+            "retries": self.retries,
+            "fallbacks": self.fallbacks,
+            "partial_responses": self.partial_responses,
+        }
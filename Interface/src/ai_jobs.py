@@ -0,0 +1,107 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+class JobQueueFull(Exception):
+    """Raised when too many AI jobs are already queued or running."""
+
+
+class AIJobQueue:
+    """Runs slow AI calls on a bounded worker pool instead of request threads.
+
+    Jobs are identified by a dedupe key; submitting a key that is already
+    queued or running returns the existing job, so repeated clicks on the
+    same plant share one model call. Finished jobs stay readable for
+    ``result_ttl`` seconds. ``on_complete(job)`` is called from the worker
+    thread once a job finishes, e.g. to push the result to the browser.
+    """
+
+    def __init__(self, max_workers=2, max_pending=32, result_ttl=600, on_complete=None):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self._on_complete = on_complete
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ai-job")
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._inflight = {}
+        self.submitted = 0
+        self.merged = 0
+        self.rejected = 0
+        self.failed = 0
+
+    def submit(self, key, owner, fn, *args):
+        """Queue ``fn(*args)`` under ``key``, or return the job already in flight for it."""
+        with self._lock:
+            self._prune()
+            job_id = self._inflight.get(key)
+            if job_id:
+                self.merged += 1
+                return dict(self._jobs[job_id])
+            if len(self._inflight) >= self.max_pending:
+                self.rejected += 1
+                raise JobQueueFull(f"{len(self._inflight)} AI jobs already pending")
+
+            job = {
+                "id": uuid.uuid4().hex,
+                "key": key,
+                "owner": owner,
+                "status": "pending",
+                "result": None,
+                "error": None,
+                "created": time.time(),
+                "finished": None,
+            }
+            self._jobs[job["id"]] = job
+            self._inflight[key] = job["id"]
+            self.submitted += 1
+
+        self._executor.submit(self._run, job["id"], fn, args)
+        return dict(job)
+
+    def _run(self, job_id, fn, args):
+        with self._lock:
+            self._jobs[job_id]["status"] = "running"
+        try:
+            result, error, status = fn(*args), None, "done"
+        except Exception as e:
+            result, error, status = None, str(e), "error"
+
+        with self._lock:
+            job = self._jobs[job_id]
+            job.update(status=status, result=result, error=error, finished=time.time())
+            self._inflight.pop(job["key"], None)
+            if status == "error":
+                self.failed += 1
+            finished = dict(job)
+
+        if self._on_complete:
+            try:
+                self._on_complete(finished)
+            except Exception as e:
+                print(f"AI job completion callback failed: {e}")
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def _prune(self):
+        cutoff = time.time() - self.result_ttl
+        for job_id in [j["id"] for j in self._jobs.values() if j["finished"] and j["finished"] < cutoff]:
+            del self._jobs[job_id]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "in_flight": len(self._inflight),
+                "max_pending": self.max_pending,
+                "retained": len(self._jobs),
+                "submitted": self.submitted,
+                "merged": self.merged,
+                "rejected": self.rejected,
+                "failed": self.failed,
+            }
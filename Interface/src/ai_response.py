@@ -0,0 +1,170 @@
+import json
+import re
+
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_OPEN_QUOTES = "“”"
+
+
+def extract_json_object(text):
+    """Return ``(candidate, complete)`` for the first JSON object in ``text``.
+
+    Scans from the first ``{`` tracking string and escape state, so braces
+    inside advice text don't confuse it. Prose or code fences around the
+    object are ignored. If the object never closes (a truncated or still
+    streaming response), the open tail is returned with ``complete`` False.
+    """
+    start = text.find("{")
+    if start == -1:
+        return None, False
+
+    depth = 0
+    in_string = False
+    escaped = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1], True
+    return text[start:], False
+
+
+def close_json(fragment, drop_open_string=False):
+    """Terminate an open string and any unclosed objects/arrays in a truncated fragment.
+
+    With ``drop_open_string`` an unterminated string is cut off (along with its
+    key) instead of closed, so only fully received values survive.
+    """
+    stack = []
+    in_string = False
+    escaped = False
+    string_start = 0
+    for i, ch in enumerate(fragment):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+            string_start = i
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]" and stack:
+            stack.pop()
+
+    if in_string and drop_open_string:
+        fragment = fragment[:string_start]
+    elif in_string:
+        fragment = (fragment[:-1] if escaped else fragment) + '"'
+    # Drop a dangling key or separator the model hadn't finished
+    fragment = re.sub(r'(,|\{)\s*"[^"]*"\s*:?\s*$', r"\1", fragment)
+    fragment = fragment.rstrip().rstrip(",").rstrip(":")
+    return fragment + "".join(reversed(stack))
+
+
+def normalize_quotes(text):
+    """Turn curly double quotes used as JSON delimiters into ``"``.
+
+    Curly quotes inside a string opened by a straight quote are advice text
+    and are kept, so translating them can't break an otherwise valid object;
+    straight quotes inside a curly-delimited string are escaped.
+    """
+    out = []
+    in_string = False
+    curly = False
+    escaped = False
+    for ch in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif curly and ch == '"':
+                ch = '\\"'
+            elif (ch in _OPEN_QUOTES) if curly else (ch == '"'):
+                in_string = False
+                ch = '"'
+        elif ch == '"' or ch in _OPEN_QUOTES:
+            in_string = True
+            curly = ch != '"'
+            ch = '"'
+        out.append(ch)
+    return "".join(out)
+
+
+def loads_lenient(candidate):
+    """json.loads with repairs for common model defects: smart quotes, trailing commas, raw newlines."""
+    normalized = normalize_quotes(candidate)
+    attempts = (
+        candidate,
+        _TRAILING_COMMA.sub(r"\1", candidate),
+        normalized,
+        _TRAILING_COMMA.sub(r"\1", normalized),
+    )
+    for attempt in attempts:
+        try:
+            # strict=False accepts literal newlines/tabs inside long paragraphs
+            return json.loads(attempt, strict=False)
+        except ValueError:
+            continue
+    return None
+
+
+def parse_json_object(text, partial=False):
+    """First JSON object in ``text`` as a dict, or None.
+
+    With ``partial`` True an unterminated object is closed off and parsed,
+    which yields whatever fields a streaming response has completed so far;
+    a value still being written is left out.
+    """
+    candidate, complete = extract_json_object(text or "")
+    if candidate is None or (not complete and not partial):
+        return None
+    parsed = loads_lenient(candidate if complete else close_json(candidate, drop_open_string=True))
+    return parsed if isinstance(parsed, dict) else None
+
+
+def valid_fields(obj, keys):
+    """Subset of ``keys`` in ``obj`` whose values are non-empty strings."""
+    if not isinstance(obj, dict):
+        return {}
+    return {key: obj[key].strip() for key in keys if isinstance(obj.get(key), str) and obj[key].strip()}
+
+
+class StreamingAdviceParser:
+    """Accumulates streamed model text and reports advice fields as they complete.
+
+    ``feed`` returns the fields that became available with this chunk. A value
+    whose string is still open at the end of the buffer is held back until it
+    closes, so clients never render half a sentence.
+    """
+
+    def __init__(self, keys):
+        self.keys = keys
+        self.text = ""
+        self.fields = {}
+
+    def feed(self, chunk):
+        self.text += chunk
+        candidate, complete = extract_json_object(self.text)
+        if candidate is None:
+            return {}
+
+        fields = valid_fields(parse_json_object(candidate, partial=not complete), self.keys)
+        new = {key: value for key, value in fields.items() if self.fields.get(key) != value}
+        self.fields.update(new)
+        return new
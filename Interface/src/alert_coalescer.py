@@ -0,0 +1,114 @@
+import threading
+import time
+
+_INSERTING = object()
+
+
+class AlertCoalescer:
+    """Collapses repeated alerts per (user, plant, event_type) inside a time window.
+
+    The first alert in a window becomes a new notification row. Repeats in the
+    same window only bump a pending counter, which is later applied to that row
+    as ``occurrences``/``last_seen_at``. Pending work is drained in batches by
+    the ingest writer, so a dry plant costs at most one insert per window plus
+    one update per flush no matter how often its sensor reports.
+    """
+
+    def __init__(self, windows):
+        self.windows = dict(windows)
+        self._lock = threading.Lock()
+        self._alerts = {}
+        self.inserted = 0
+        self.suppressed = 0
+
+    @staticmethod
+    def parse_windows(spec, defaults):
+        """Parse ``"low_moisture=3600,critical_moisture=900"`` over a dict of defaults."""
+        windows = dict(defaults)
+        for part in (spec or "").split(","):
+            if "=" in part:
+                event_type, seconds = part.split("=", 1)
+                windows[event_type.strip()] = int(seconds)
+        return windows
+
+    def handles(self, event_type):
+        return self.windows.get(event_type, 0) > 0
+
+    def offer(self, user_id, plant_id, title, message, event_type):
+        """Record an alert. Returns True if it opens a new window (a new row will be written)."""
+        key = (user_id, plant_id, event_type)
+        now = time.monotonic()
+        with self._lock:
+            alert = self._alerts.get(key)
+            if alert and now - alert["opened"] < self.windows[event_type]:
+                alert["repeats"] += 1
+                alert["title"] = title
+                alert["message"] = message
+                self.suppressed += 1
+                return False
+
+            self._alerts[key] = {
+                "key": key,
+                "user_id": user_id,
+                "plant_id": plant_id,
+                "event_type": event_type,
+                "title": title,
+                "message": message,
+                "opened": now,
+                "id": None,
+                "repeats": 0,
+            }
+            return True
+
+    def drain(self):
+        """Take pending work as (inserts, updates).
+
+        ``inserts`` are alert dicts needing a new row (``repeats`` already folded
+        in); report their row ids back with ``mark_inserted``. ``updates`` are
+        ``(repeats, title, message, row_id)`` tuples for rows that already exist.
+        """
+        now = time.monotonic()
+        inserts, updates = [], []
+        with self._lock:
+            for key, alert in list(self._alerts.items()):
+                if alert["id"] is None:
+                    inserts.append(dict(alert))
+                    alert["id"] = _INSERTING
+                    alert["repeats"] = 0
+                elif alert["id"] is _INSERTING:
+                    continue
+                elif alert["repeats"]:
+                    updates.append((alert["repeats"], alert["title"], alert["message"], alert["id"]))
+                    alert["repeats"] = 0
+                elif now - alert["opened"] >= self.windows[alert["event_type"]]:
+                    # Window closed with nothing pending
+                    del self._alerts[key]
+        return inserts, updates
+
+    def mark_inserted(self, key, row_id):
+        with self._lock:
+            alert = self._alerts.get(key)
+            if alert and alert["id"] is _INSERTING:
+                alert["id"] = row_id
+            self.inserted += 1
+
+    def discard(self, key):
+        """Forget an alert whose insert failed; the next reading reopens it."""
+        with self._lock:
+            self._alerts.pop(key, None)
+
+    def discard_row(self, row_id):
+        """Forget the alert behind a row that no longer exists (e.g. the user deleted it)."""
+        with self._lock:
+            for key, alert in list(self._alerts.items()):
+                if alert["id"] == row_id:
+                    del self._alerts[key]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "open_windows": len(self._alerts),
+                "inserted": self.inserted,
+                "suppressed": self.suppressed,
+                "windows": self.windows,
+            }
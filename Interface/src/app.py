@@ -1,52 +1,34 @@
+import hashlib
+import json
+import math
 import os
 import re
+import tempfile
 import threading
 import time
-from datetime import datetime
+from contextlib import nullcontext
+from datetime import datetime, timedelta
 
 os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'
 
-# Try to import OAuth - handle gracefully if not available
-try:
-    from authlib.integrations.flask_client import OAuth
-    print("✓ OAuth imported successfully from authlib")
-except ImportError:
-    try:
-        import authlib.integrations.flask_client as flask_auth
-        OAuth = flask_auth.OAuth
-        print("✓ OAuth imported via alternative method")
-    except ImportError as e:
-        print(f"✗ Failed to import OAuth: {e}")
-        print("⚠ Google OAuth will not be available")
-        # Create a dummy class so the app doesn't crash
-        class DummyOAuth:
-            def __init__(self, app=None):
-                self.app = app
-            def register(self, **kwargs):
-                class DummyClient:
-                    def authorize_redirect(self, *args, **kwargs):
-                        return None
-                    def authorize_access_token(self):
-                        return {}
-                    def get(self, *args, **kwargs):
-                        class DummyResponse:
-                            json = lambda: {}
-                        return DummyResponse()
-                return DummyClient()
-            def init_app(self, app):
-                pass
-        OAuth = DummyOAuth
-
-# Other imports
-import pubnub
-from flask import Flask, render_template, redirect, request, session, flash, url_for, jsonify
-from flask_mysqldb import MySQL
+from flask import Flask, Response, render_template, redirect, request, session, flash, url_for, jsonify, \
+    has_app_context
 from pubnub.callbacks import SubscribeCallback
-from pubnub.pnconfiguration import PNConfiguration
-from pubnub.pubnub import PubNub
 from werkzeug.security import generate_password_hash, check_password_hash
 from dotenv import load_dotenv
-import google.generativeai as genai
+
+from Interface.src.advice_cache import AdviceCache
+from Interface.src.ai_analyzer import PlantCareAIAnalyzer
+from Interface.src.ai_jobs import AIJobQueue, JobQueueFull
+from Interface.src.alert_coalescer import AlertCoalescer
+from Interface.src.db_pool import PooledMySQL
+from Interface.src.events import EventHub, StreamLimitReached, UserVersions
+from Interface.src.ingest import IngestPipeline
+from Interface.src.plant_registry import PlantRegistry
+from Interface.src.pump_state import PumpStateMachine
+from Interface.src.retention import RetentionEngine
+from Interface.src.scheduler import DeadlineScheduler
+from Interface.src.unread_counter import UnreadCounter
 
 # Load environment variables
 load_dotenv()
@@ -60,117 +42,404 @@ app.config.update(
     MYSQL_USER=os.getenv("MYSQL_USER"),
     MYSQL_PASSWORD=os.getenv("MYSQL_PASSWORD", ""),
     MYSQL_DB='SmartIrrigation',
-    MYSQL_CURSORCLASS="DictCursor"
-)
-mysql = MySQL(app)
-
-# Initialize OAuth
-oauth = OAuth(app)
-
-# OAuth Configuration for Google Login
-google = oauth.register(
-    name='google',
-    client_id=os.getenv("GOOGLE_CLIENT_ID"),
-    client_secret=os.getenv("GOOGLE_CLIENT_SECRET"),
-    server_metadata_url='https://accounts.google.com/.well-known/openid-configuration',
-    client_kwargs={'scope': 'openid email profile',
-                   'prompt': 'select_account'
-                   }
+    MYSQL_CURSORCLASS="DictCursor",
+    MYSQL_POOL_SIZE=int(os.getenv("MYSQL_POOL_SIZE", 10)),
+    MYSQL_POOL_TIMEOUT=float(os.getenv("MYSQL_POOL_TIMEOUT", 5))
 )
+# Shared connection pool for web requests and background threads
+mysql = PooledMySQL(app)
+
+_google_client = None
+_google_lock = threading.Lock()
+
+
+def get_google_client():
+    """Google OAuth client, built on first use so authlib is only imported when someone signs in"""
+    global _google_client
+    with _google_lock:
+        if _google_client is None:
+            from authlib.integrations.flask_client import OAuth
+            oauth = OAuth(app)
+            _google_client = oauth.register(
+                name='google',
+                client_id=os.getenv("GOOGLE_CLIENT_ID"),
+                client_secret=os.getenv("GOOGLE_CLIENT_SECRET"),
+                server_metadata_url='https://accounts.google.com/.well-known/openid-configuration',
+                client_kwargs={'scope': 'openid email profile',
+                               'prompt': 'select_account'
+                               }
+            )
+    return _google_client
+
+
+_pubnub_client = None
+_pubnub_lock = threading.Lock()
+
+
+def get_pubnub():
+    """Shared PubNub client for moisture data and pump commands, created on first use"""
+    global _pubnub_client
+    with _pubnub_lock:
+        if _pubnub_client is None:
+            from pubnub.pnconfiguration import PNConfiguration
+            from pubnub.pubnub import PubNub
+
+            pn_config = PNConfiguration()
+            pn_config.subscribe_key = os.getenv('PUBNUB_SUBSCRIBE_KEY')
+            pn_config.publish_key = os.getenv('PUBNUB_PUBLISH_KEY')
+            pn_config.user_id = "floravita_server"
+            _pubnub_client = PubNub(pn_config)
+    return _pubnub_client
+
+
+def load_registered_plants():
+    """Fetch the columns the ingest path needs for every plant (requires an app context)"""
+    cur = mysql.connection.cursor()
+    try:
+        cur.execute("""
+                    SELECT id, name, moisture_threshold, user_id, hardware_id, watering_duration
+                    FROM plants
+                    """)
+        return cur.fetchall()
+    finally:
+        cur.close()
+
+
+# hardware_id -> plant mapping shared by the whole process
+plant_registry = PlantRegistry(load_registered_plants)
+
+# Per-user fan-out of live updates for /api/stream. Under a threaded worker each open stream
+# holds a request thread, so STREAM_MAX_CONNECTIONS must stay well below the thread count
+# (e.g. 8 of gunicorn's --threads 16); a gevent/eventlet worker lifts that limit
+event_hub = EventHub(max_streams=int(os.getenv("STREAM_MAX_CONNECTIONS", 8)))
+
+# Per-user change counters behind the ETags of the polled endpoints
+data_versions = UserVersions()
+
+
+def not_modified(etag):
+    """Empty 304 response for a poll whose ETag still matches"""
+    response = Response(status=304)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def db_context():
+    """App context for background DB work that reuses the caller's context (and pooled connection) if one is active"""
+    return nullcontext() if has_app_context() else app.app_context()
+
+
+def publish_pump_state(plant_id, state):
+    """Push a pump state change to the plant owner's open dashboards"""
+    with db_context():
+        plant = plant_registry.get_by_id(plant_id)
+    if plant:
+        event_hub.publish(plant['user_id'], "pump", {
+            "plant_id": plant_id,
+            "state": state,
+            "active": state == "WATERING"
+        })
+
+
+# Per-plant pump state (IDLE -> WATERING -> COOLDOWN) used for auto-watering decisions
+pump_states = PumpStateMachine(cooldown_seconds=int(os.getenv("PUMP_COOLDOWN_SECONDS", 60)),
+                               on_change=publish_pump_state)
+
+# Single heap-backed thread owning every pump-off deadline, keyed by plant_id; PUMP_OFF
+# publishes and their DB writes run on PUMP_OFF_WORKERS threads so a slow one delays no other plant
+pump_scheduler = DeadlineScheduler(name="pump-scheduler", workers=int(os.getenv("PUMP_OFF_WORKERS", 4)))
 
-# PubNub Configuration for Moisture Data
-pn_config = PNConfiguration()
-pn_config.subscribe_key = os.getenv('PUBNUB_SUBSCRIBE_KEY')
-pn_config.publish_key = os.getenv('PUBNUB_PUBLISH_KEY')
-pn_config.user_id = "floravita_server"
-pubnub = PubNub(pn_config)
+# Long-running maintenance gets its own thread so it never delays a pump-off deadline
+maintenance_scheduler = DeadlineScheduler(name="maintenance-scheduler")
+
+# Raw readings are rolled up into minute/hour/day tables and trimmed after RETENTION_RAW_DAYS
+retention = RetentionEngine(mysql.pool,
+                            raw_days=int(os.getenv("RETENTION_RAW_DAYS", 7)),
+                            minute_days=int(os.getenv("RETENTION_MINUTE_DAYS", 30)),
+                            hour_days=int(os.getenv("RETENTION_HOUR_DAYS", 365)),
+                            day_days=int(os.getenv("RETENTION_DAY_DAYS", 0)),
+                            interval_seconds=int(os.getenv("RETENTION_INTERVAL_SECONDS", 300)),
+                            chunk_size=int(os.getenv("RETENTION_CHUNK_SIZE", 5000)),
+                            late_seconds=int(os.getenv("RETENTION_LATE_SECONDS", 3600)))
+
+
+def get_watering_duration(plant_id):
+    """Per-plant pump run time in seconds from plants.watering_duration"""
+    plant = plant_registry.get_by_id(plant_id)
+    return plant['watering_duration'] if plant else 10
+
+
+def record_pump_event(cur, plant_id, pump_on, automated):
+    """Log a pump transition in history and in the plant_latest summary (caller commits)"""
+    cur.execute("""
+                INSERT INTO moisture_readings (plant_id, pump_status, is_automated)
+                VALUES (%s, %s, %s)
+                """, (plant_id, pump_on, automated))
+    cur.execute("""
+                INSERT INTO plant_latest (plant_id, pump_status, pump_changed_at)
+                VALUES (%s, %s, NOW())
+                ON DUPLICATE KEY UPDATE pump_status     = VALUES(pump_status),
+                                        pump_changed_at = VALUES(pump_changed_at)
+                """, (plant_id, pump_on))
+
+
+def send_pump_off_command(plant_id, plant_name):
+    """Helper function to send pump off command after duration"""
+    pump_states.finish_watering(plant_id)
+    try:
+        get_pubnub().publish().channel("pump-commands").message({
+            "command": "PUMP_OFF",
+            "plant_id": plant_id,
+            "plant_name": plant_name,
+            "reason": "manual_complete",
+            "timestamp": datetime.now().isoformat()
+        }).sync()
+
+        # Log pump off so state can be rebuilt after a restart
+        with db_context():
+            cur = mysql.connection.cursor()
+            record_pump_event(cur, plant_id, False, False)
+            mysql.connection.commit()
+            cur.close()
+    except Exception as e:
+        print(f"Error sending pump off command: {e}")
+
+
+def restore_pump_states():
+    """Rebuild pump states from the newest pump row per plant (requires an app context)"""
+    cur = mysql.connection.cursor()
+    try:
+        # plant_latest carries the newest pump event per plant
+        cur.execute("""
+                    SELECT plant_id, pump_status, pump_changed_at AS recorded_at
+                    FROM plant_latest
+                    WHERE pump_changed_at IS NOT NULL
+                    """)
+        rows = cur.fetchall()
+    finally:
+        cur.close()
+
+    for row in rows:
+        pump_states.restore(row['plant_id'], bool(row['pump_status']), row['recorded_at'].timestamp())
+
+        # A pump left ON across a restart lost its deadline; re-arm it from the original start
+        if row['pump_status']:
+            plant = plant_registry.get_by_id(row['plant_id'])
+            elapsed = time.time() - row['recorded_at'].timestamp()
+            delay = max(0.0, get_watering_duration(row['plant_id']) - elapsed)
+            pump_scheduler.schedule(row['plant_id'], delay, send_pump_off_command,
+                                    row['plant_id'], plant['name'] if plant else "Unknown")
+    return len(rows)
+
+
+# Readings older than the max age or further ahead than the skew are dropped; a small
+# future skew and readings sent without a timestamp are stamped with the arrival time
+READING_MAX_AGE_SECONDS = int(os.getenv("INGEST_MAX_READING_AGE_SECONDS", 7 * 86400))
+READING_MAX_SKEW_SECONDS = int(os.getenv("INGEST_MAX_CLOCK_SKEW_SECONDS", 60))
+# Older readings are catch-up from a bridge spool rather than current conditions
+READING_LIVE_SECONDS = int(os.getenv("INGEST_LIVE_SECONDS", 300))
+
+
+def reading_time(timestamp):
+    """recorded_at for a reading from its epoch-seconds timestamp, or None if it must be dropped.
+
+    Old backlog is never re-stamped to now: it would look live, overwrite
+    plant_latest and could trigger alerts or watering from stale moisture.
+    """
+    now = time.time()
+    if timestamp is None:
+        return datetime.fromtimestamp(now)
+    try:
+        timestamp = float(timestamp)
+    except (TypeError, ValueError):
+        return None
+    if not now - READING_MAX_AGE_SECONDS <= timestamp <= now + READING_MAX_SKEW_SECONDS:
+        return None
+    return datetime.fromtimestamp(min(timestamp, now))
 
 
 class MoistureSubscriber(SubscribeCallback):
+    def __init__(self):
+        super().__init__()
+        self.ingest = IngestPipeline(
+            self.write_batch,
+            max_queue=int(os.getenv("INGEST_QUEUE_SIZE", 10000)),
+            max_batch=int(os.getenv("INGEST_BATCH_SIZE", 500)),
+            max_linger=int(os.getenv("INGEST_LINGER_MS", 250)) / 1000.0
+        )
+        self.out_of_range = 0
+
     def message(self, pubnub, message):
-        """Handle incoming moisture data from sensors"""
+        """Queue incoming moisture data for the batch writer.
+
+        Accepts a single reading ``{"hardware_id", "moisture", "status", "timestamp"}``
+        or a bridge envelope ``{"v": 1, "batch": {hardware_id: [[timestamp, moisture, status], ...]}}``.
+        """
         data = message.message
-        hardware_id = data.get("hardware_id")
-        moisture = data.get("moisture")
-        status = data.get("status")
+        if not isinstance(data, dict):
+            print(f"Ignoring malformed moisture message: {data}")
+            return
+
+        batch = data.get("batch")
+        if batch is None:
+            self.submit_reading(data.get("hardware_id"), data.get("moisture"),
+                                data.get("status"), data.get("timestamp"))
+            return
+
+        if isinstance(batch, dict):
+            for hardware_id, entries in batch.items():
+                for entry in entries or []:
+                    if isinstance(entry, (list, tuple)) and len(entry) >= 2:
+                        self.submit_reading(hardware_id, entry[1], entry[2] if len(entry) > 2 else None, entry[0])
+        elif isinstance(batch, list):
+            for entry in batch:
+                if isinstance(entry, dict):
+                    self.submit_reading(entry.get("hardware_id"), entry.get("moisture"),
+                                        entry.get("status"), entry.get("timestamp"))
+
+    def submit_reading(self, hardware_id, moisture, status, timestamp):
+        if not hardware_id or moisture is None:
+            print(f"Ignoring malformed moisture reading from {hardware_id}: {moisture}")
+            return
 
-        print(f"Received moisture data: {hardware_id} - {moisture}%")
+        try:
+            moisture = float(moisture)
+        except (TypeError, ValueError):
+            print(f"Ignoring non-numeric moisture from {hardware_id}: {moisture}")
+            return
+
+        recorded_at = reading_time(timestamp)
+        if recorded_at is None:
+            # Spooled backlog can be days long; report drops in bulk rather than per reading
+            self.out_of_range += 1
+            if self.out_of_range % 1000 == 1:
+                print(f"Dropped {self.out_of_range} readings with out-of-range timestamps "
+                      f"(latest from {hardware_id}: {timestamp})")
+            return
+
+        self.ingest.submit({
+            "hardware_id": hardware_id,
+            "moisture": moisture,
+            "status": status,
+            "recorded_at": recorded_at
+        })
 
-        # Use Flask application context
+    def write_batch(self, readings):
+        """Persist a micro-batch of readings drained from the ingest queue"""
         with app.app_context():
-            try:
-                cur = mysql.connection.cursor()
+            rows = []
+            latest = {}
+            unknown = set()
+            for reading in readings:
+                # Registry lookup is in-memory; no query per reading
+                plant = plant_registry.get(reading["hardware_id"])
+                if not plant:
+                    unknown.add(reading["hardware_id"])
+                    continue
+                recorded_at = reading["recorded_at"]
+                rows.append((plant['id'], reading["moisture"], recorded_at))
+                # Batches can arrive out of order; the newest reading per plant wins
+                if plant['id'] not in latest or recorded_at >= latest[plant['id']][2]:
+                    latest[plant['id']] = (plant, reading["moisture"], recorded_at)
+
+            if unknown:
+                print(f"No plant found with hardware_id(s): {', '.join(sorted(unknown))}")
+
+            if not rows:
+                return
 
-                # Find which plant this hardware belongs to
-                cur.execute("SELECT id, name, moisture_threshold, user_id FROM plants WHERE hardware_id = %s",
-                            (hardware_id,))
-                plant = cur.fetchone()
-
-                if plant:
-                    plant_id = plant['id']
-                    plant_name = plant['name']
-                    threshold = plant['moisture_threshold']
-                    user_id = plant['user_id']
-
-                    # Insert moisture reading
-                    cur.execute("""
-                                INSERT INTO moisture_readings (plant_id, moisture_level, pump_status, is_automated)
-                                VALUES (%s, %s, FALSE, FALSE)
-                                """, (plant_id, moisture))
-
-                    # Update plant's last moisture
-                    cur.execute("""
-                                UPDATE plants
-                                SET last_moisture = %s,
-                                    last_update   = NOW()
-                                WHERE id = %s
-                                """, (moisture, plant_id))
-
-                    mysql.connection.commit()
-                    print(f"Updated plant {plant_id} with moisture {moisture}%")
-
-                    # Check for critically low moisture (even if not below threshold)
-                    if moisture < 20:  # Critical level
-                        create_notification(
-                            user_id,
-                            plant_id,
-                            "Critical Moisture Alert",
-                            f"{plant_name} moisture is critically low: {moisture}%. Immediate attention required!",
-                            'critical_moisture'
-                        )
-                    elif moisture < threshold:
-                        create_notification(
-                            user_id,
-                            plant_id,
-                            "Low Moisture Alert",
-                            f"{plant_name} moisture is low: {moisture}% (threshold: {threshold}%).",
-                            'low_moisture'
-                        )
-
-                        # Check if pump is already running
-                        cur.execute("""
-                                    SELECT pump_status
-                                    FROM moisture_readings
-                                    WHERE plant_id = %s
-                                    ORDER BY recorded_at DESC LIMIT 1
-                                    """, (plant_id,))
-                        last_pump_status = cur.fetchone()
-
-                        # Only trigger if pump wasn't already ON
-                        if not last_pump_status or not last_pump_status['pump_status']:
-                            # Trigger automatic watering
-                            self.trigger_automatic_watering(plant_id, plant_name, threshold, moisture)
-
-                else:
-                    print(f"No plant found with hardware_id: {hardware_id}")
+            cur = mysql.connection.cursor()
+            try:
+                # executemany collapses this into one multi-row INSERT
+                cur.executemany("""
+                                INSERT INTO moisture_readings (plant_id, moisture_level, pump_status, is_automated, recorded_at)
+                                VALUES (%s, %s, FALSE, FALSE, %s)
+                                """, rows)
+
+                # One upsert of the latest-reading summary for every plant in the batch;
+                # moisture_level is assigned first, so it compares against the stored recorded_at
+                cur.executemany("""
+                                INSERT INTO plant_latest (plant_id, moisture_level, recorded_at)
+                                VALUES (%s, %s, %s)
+                                ON DUPLICATE KEY UPDATE
+                                    moisture_level = IF(recorded_at IS NULL OR VALUES(recorded_at) >= recorded_at,
+                                                        VALUES(moisture_level), moisture_level),
+                                    recorded_at    = IF(recorded_at IS NULL OR VALUES(recorded_at) >= recorded_at,
+                                                        VALUES(recorded_at), recorded_at)
+                                """, [(plant_id, moisture, recorded_at)
+                                      for plant_id, (_, moisture, recorded_at) in latest.items()])
+
+                # Spooled backlog older than the rollup's re-roll window is flagged so the
+                # next retention run rolls it up before raw rows can be trimmed
+                oldest = min(recorded_at for _, _, recorded_at in rows)
+                if oldest < datetime.now() - retention.late:
+                    retention.mark_late(cur, oldest)
 
-                cur.close()
-            except Exception as e:
-                print(f"Error updating moisture data: {e}")
+                mysql.connection.commit()
+            except Exception:
                 try:
                     mysql.connection.rollback()
                 except:
                     pass
+                raise
+            finally:
+                cur.close()
+
+            # Backlog replayed by a reconnecting bridge is stored but neither pushed
+            # live nor allowed to trigger alerts or auto-watering
+            live_since = datetime.now() - timedelta(seconds=READING_LIVE_SECONDS)
+            live = {plant_id: entry for plant_id, entry in latest.items() if entry[2] >= live_since}
+            for plant_id, (plant, moisture, recorded_at) in latest.items():
+                data_versions.bump(plant['user_id'], "moisture")
+                if plant_id in live:
+                    event_hub.publish(plant['user_id'], "moisture", {
+                        "plant_id": plant_id,
+                        "moisture": moisture,
+                        "timestamp": recorded_at.isoformat()
+                    })
+
+            # Alerts and auto-watering only need each plant's newest reading
+            watering = [(plant, moisture) for plant, moisture, _ in live.values()
+                        if self.check_moisture_levels(plant, moisture)]
+
+            # Write this batch's coalesced alerts in one transaction
+            flush_alerts()
+
+        # PUMP_ON publishes block on the network, so they run after the batch's connection is returned
+        for plant, moisture in watering:
+            self.trigger_automatic_watering(plant['id'], plant['name'], plant['moisture_threshold'], moisture)
+
+    def check_moisture_levels(self, plant, moisture):
+        """Raise alerts for a plant's latest reading; returns True if it should be watered now"""
+        plant_id = plant['id']
+        plant_name = plant['name']
+        threshold = plant['moisture_threshold']
+        user_id = plant['user_id']
+        try:
+            # Check for critically low moisture (even if not below threshold)
+            if moisture < 20:  # Critical level
+                queue_alert(
+                    user_id,
+                    plant_id,
+                    "Critical Moisture Alert",
+                    f"{plant_name} moisture is critically low: {moisture}%. Immediate attention required!",
+                    'critical_moisture'
+                )
+            elif moisture < threshold:
+                queue_alert(
+                    user_id,
+                    plant_id,
+                    "Low Moisture Alert",
+                    f"{plant_name} moisture is low: {moisture}% (threshold: {threshold}%).",
+                    'low_moisture'
+                )
+
+                # Pump state is tracked in memory; trigger only from IDLE
+                return pump_states.begin_watering(plant_id, automatic=True)
+        except Exception as e:
+            print(f"Error checking moisture levels for plant {plant_id}: {e}")
+        return False
 
     def trigger_automatic_watering(self, plant_id, plant_name, threshold, current_moisture):
         """Trigger automatic watering when moisture is below threshold"""
@@ -181,26 +450,31 @@ class MoistureSubscriber(SubscribeCallback):
             user_id = self.get_user_id_for_plant(plant_id)
             if not user_id:
                 print(f"Could not find user for plant {plant_id}")
+                pump_states.reset(plant_id)
                 return
 
+            duration = get_watering_duration(plant_id)
+
             # 1. Send command to pump
-            pubnub.publish().channel("pump-commands").message({
+            get_pubnub().publish().channel("pump-commands").message({
                 "command": "PUMP_ON",
                 "plant_id": plant_id,
                 "plant_name": plant_name,
                 "reason": "automatic",
+                "duration": duration,
                 "threshold": threshold,
                 "current_moisture": current_moisture,
                 "timestamp": datetime.now().isoformat()
             }).sync()
 
+            # Arm the pump-off deadline as soon as the pump is on; the controller has no timer
+            # of its own, so a failure in the DB work below must not leave it running
+            pump_scheduler.schedule(plant_id, duration, self.turn_off_pump, plant_id, plant_name, user_id)
+
             # 2. Log in database with is_automated = TRUE
-            with app.app_context():
+            with db_context():
                 cur = mysql.connection.cursor()
-                cur.execute("""
-                            INSERT INTO moisture_readings (plant_id, pump_status, is_automated)
-                            VALUES (%s, TRUE, TRUE)
-                            """, (plant_id,))
+                record_pump_event(cur, plant_id, True, True)
 
                 # 3. Create notification for automatic watering
                 create_notification(
@@ -216,11 +490,11 @@ class MoistureSubscriber(SubscribeCallback):
 
             print(f"Created notification for auto-watering of {plant_name}")
 
-            # Schedule pump turn off after 10 seconds
-            threading.Timer(10.0, self.turn_off_pump, args=[plant_id, plant_name, user_id]).start()
-
         except Exception as e:
             print(f"Error triggering automatic watering: {e}")
+            # Once the pump is on its deadline owns the state; only an unsent command resets it
+            if pump_scheduler.remaining(plant_id) is None:
+                pump_states.reset(plant_id)
             import traceback
             traceback.print_exc()
 
@@ -228,8 +502,9 @@ class MoistureSubscriber(SubscribeCallback):
         """Turn off pump after duration"""
         try:
             print(f"AUTO: Turning off pump for {plant_name}")
+            pump_states.finish_watering(plant_id)
 
-            pubnub.publish().channel("pump-commands").message({
+            get_pubnub().publish().channel("pump-commands").message({
                 "command": "PUMP_OFF",
                 "plant_id": plant_id,
                 "plant_name": plant_name,
@@ -238,12 +513,9 @@ class MoistureSubscriber(SubscribeCallback):
             }).sync()
 
             # Log pump off in database
-            with app.app_context():
+            with db_context():
                 cur = mysql.connection.cursor()
-                cur.execute("""
-                            INSERT INTO moisture_readings (plant_id, pump_status, is_automated)
-                            VALUES (%s, FALSE, TRUE)
-                            """, (plant_id,))
+                record_pump_event(cur, plant_id, False, True)
 
                 # Create notification for pump completion
                 create_notification(
@@ -263,17 +535,13 @@ class MoistureSubscriber(SubscribeCallback):
             print(f"Error turning off pump: {e}")
 
     def get_user_id_for_plant(self, plant_id):
-        """Get user_id for a plant"""
-        with app.app_context():
-            try:
-                cur = mysql.connection.cursor()
-                cur.execute("SELECT user_id FROM plants WHERE id = %s", (plant_id,))
-                result = cur.fetchone()
-                cur.close()
-                return result['user_id'] if result else None
-            except Exception as e:
-                print(f"Error getting user_id for plant {plant_id}: {e}")
-                return None
+        """Get user_id for a plant from the in-memory registry"""
+        try:
+            plant = plant_registry.get_by_id(plant_id)
+            return plant['user_id'] if plant else None
+        except Exception as e:
+            print(f"Error getting user_id for plant {plant_id}: {e}")
+            return None
 
     def status(self, pubnub, status):
         if status.category == "PNConnectedCategory":
@@ -283,34 +551,135 @@ class MoistureSubscriber(SubscribeCallback):
         pass
 
 
+moisture_listener = MoistureSubscriber()
+
+
 # Start PubNub listener in background thread
 def start_pubnub_listener():
     """Start PubNub subscription in background thread"""
     try:
-        listener = MoistureSubscriber()
-        pubnub.add_listener(listener)
-        pubnub.subscribe().channels("moisture-data").execute()
+        moisture_listener.ingest.start()
+        client = get_pubnub()
+        client.add_listener(moisture_listener)
+        client.subscribe().channels("moisture-data").execute()
         print("Moisture data listener started")
     except Exception as e:
         print(f"Error starting PubNub listener: {e}")
 
 
-# Start the listener when Flask starts
-with app.app_context():
+_services_started = False
+_services_refused = False
+# create_app()'s explicit start_services choice; None until the factory runs
+_services_choice = None
+_services_lock = threading.Lock()
+_services_lock_file = None
+
+# Lock file that makes exactly one process on this host the services owner
+SERVICES_LOCK_PATH = os.getenv("FLORAVITA_SERVICES_LOCK",
+                               os.path.join(tempfile.gettempdir(), "floravita-services.lock"))
+
+
+def claim_services_ownership():
+    """Take the host-wide services lock; False if another process already owns the services"""
+    global _services_lock_file
+    try:
+        import fcntl
+    except ImportError:
+        return True  # no flock (Windows dev box); a single dev server is the only process
+    lock_file = open(SERVICES_LOCK_PATH, "a")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False
+    # Held open for the life of the process; the OS releases it on exit
+    _services_lock_file = lock_file
+    return True
+
+
+def start_background_services():
+    """Start the schedulers, retention job and PubNub listener in the owning process.
+
+    Importing this module never starts threads. Only one process may own the
+    services: the PubNub subscriber, pump state and deadlines, and registry all
+    live in memory, so a second owner would store every reading twice and send
+    its own PUMP_ON commands. The first process to take SERVICES_LOCK_PATH
+    wins; later callers get False. Idempotent.
+    """
+    global _services_started
+    with _services_lock:
+        if _services_started:
+            return True
+        if not claim_services_ownership():
+            print(f"Background services are owned by another process ({SERVICES_LOCK_PATH})")
+            return False
+        _services_started = True
+
+    with app.app_context():
+        try:
+            plant_registry.load()
+            print(f"Plant registry loaded: {plant_registry.stats()['plants']} plants")
+        except Exception as e:
+            print(f"Could not preload plant registry (will load on first reading): {e}")
+
+        try:
+            pump_scheduler.start()
+            print(f"Pump states restored for {restore_pump_states()} plants")
+        except Exception as e:
+            print(f"Could not restore pump states: {e}")
+
+    # First pass shortly after startup, then every RETENTION_INTERVAL_SECONDS
+    retention.schedule(maintenance_scheduler, delay=30)
+
     try:
         # Run in a separate thread to not block Flask
         thread = threading.Thread(target=start_pubnub_listener, daemon=True)
         thread.start()
-        time.sleep(1)  # Give it a moment to connect
     except Exception as e:
         print(f"Could not start PubNub listener: {e}")
+    return True
+
+
+def create_app(start_services=True):
+    """Return the configured app, starting background services in this process.
+
+    Live updates, ETag versions, unread counters, pump state and the plant
+    registry are all per process and only kept current where the services
+    run, so the app is served by exactly one process that owns them, with
+    threads for concurrency, e.g.
+    ``gunicorn -w 1 --threads 16 'Interface.src.app:create_app()'``; each open
+    /api/stream pins one of those threads, so STREAM_MAX_CONNECTIONS stays
+    below ``--threads`` (or use ``-k gevent``). Raises RuntimeError if another
+    process already owns the services. With ``start_services`` False nothing
+    starts and the process answers every request with 503; use that only for
+    processes that never serve, such as the debug reloader's parent.
+    """
+    global _services_choice
+    _services_choice = start_services
+    if start_services and not start_background_services():
+        raise RuntimeError(f"Another process owns the background services ({SERVICES_LOCK_PATH}); "
+                           f"serve FloraVita from a single worker process")
+    return app
 
-# Configure Gemini AI
-api_key = os.getenv("GEMINI_API_KEY")
-if not api_key:
-    print("WARNING: GEMINI_API_KEY not found in .env file!")
-genai.configure(api_key=api_key)
-ai_model = genai.GenerativeModel('gemini-1.5-flash')
+
+@app.before_request
+def ensure_background_services():
+    """Refuse to serve from a process that does not run the background services.
+
+    ``flask run`` and ``module:app`` WSGI targets use the module-level ``app``
+    and never call create_app(); they start the services on the first request.
+    A process without them would answer from state nothing keeps current.
+    """
+    global _services_refused
+    if _services_started:
+        return None
+    if _services_choice is None and not _services_refused:
+        print("App served without create_app(); starting background services on first request")
+        if start_background_services():
+            return None
+        _services_refused = True
+    return Response("This process does not run FloraVita's background services; "
+                    "serve the app from a single worker process", status=503)
 
 
 def login_required(f):
@@ -452,6 +821,13 @@ def google_login():
     if 'user_id' in session:
         return redirect(url_for('dashboard'))
 
+    try:
+        google = get_google_client()
+    except ImportError as e:
+        print(f"Google OAuth unavailable: {e}")
+        flash("Google sign-in is not available right now.", "error")
+        return redirect(url_for('login'))
+
     redirect_uri = url_for('google_authorize', _external=True)
     return google.authorize_redirect(redirect_uri)
 
@@ -460,6 +836,8 @@ def google_login():
 def google_authorize():
 
     try:
+        google = get_google_client()
+
         # Fetch access token
         token = google.authorize_access_token()
 
@@ -602,74 +980,447 @@ def create_notification(user_id, plant_id, title, message, event_type):
                     VALUES (%s, %s, %s, %s, %s, FALSE)
                     """, (user_id, plant_id, title, message, event_type))
         mysql.connection.commit()
+        unread_counter.adjust(user_id, 1)
         print(f"Notification created: {title}")
     except Exception as e:
         print(f"Error creating notification: {e}")
         mysql.connection.rollback()
+        return
+    finally:
+        cur.close()
+
+    sync_unread(user_id)
+
+
+# Repeated low/critical moisture alerts collapse into one row per window, e.g.
+# ALERT_COALESCE_WINDOWS="low_moisture=3600,critical_moisture=900" (seconds, 0 disables)
+alert_coalescer = AlertCoalescer(AlertCoalescer.parse_windows(
+    os.getenv("ALERT_COALESCE_WINDOWS"),
+    {"low_moisture": 3600, "critical_moisture": 900}
+))
+
+
+def queue_alert(user_id, plant_id, title, message, event_type):
+    """Route an alert through the coalescer; types without a window are written immediately"""
+    if not alert_coalescer.handles(event_type):
+        create_notification(user_id, plant_id, title, message, event_type)
+    elif user_id:
+        alert_coalescer.offer(user_id, plant_id, title, message, event_type)
+
+
+def flush_alerts():
+    """Write pending coalesced alerts and repeat counters in one transaction (requires an app context)"""
+    inserts, updates = alert_coalescer.drain()
+    if not inserts and not updates:
+        return
+
+    cur = mysql.connection.cursor()
+    inserted = []
+    try:
+        for alert in inserts:
+            cur.execute("""
+                        INSERT INTO user_notifications (user_id, plant_id, title, message, event_type, is_read,
+                                                        occurrences, last_seen_at)
+                        VALUES (%s, %s, %s, %s, %s, FALSE, %s, NOW())
+                        """, (alert['user_id'], alert['plant_id'], alert['title'], alert['message'],
+                              alert['event_type'], 1 + alert['repeats']))
+            inserted.append((alert, cur.lastrowid))
+
+        missing = []
+        for update in updates:
+            cur.execute("""
+                        UPDATE user_notifications
+                        SET occurrences  = occurrences + %s,
+                            title        = %s,
+                            message      = %s,
+                            last_seen_at = NOW()
+                        WHERE id = %s
+                        """, update)
+            # occurrences always changes, so 0 affected rows means the row was deleted
+            if cur.rowcount == 0:
+                missing.append(update[3])
+
+        mysql.connection.commit()
+        # The next reading for these opens a fresh notification instead of updating nothing
+        for row_id in missing:
+            alert_coalescer.discard_row(row_id)
+    except Exception as e:
+        print(f"Error flushing coalesced alerts: {e}")
+        mysql.connection.rollback()
+        for alert in inserts:
+            alert_coalescer.discard(alert['key'])
+        return
     finally:
         cur.close()
 
+    for alert, row_id in inserted:
+        alert_coalescer.mark_inserted(alert['key'], row_id)
+        unread_counter.adjust(alert['user_id'], 1)
+    for user_id in {alert['user_id'] for alert, _ in inserted}:
+        sync_unread(user_id)
+
+
+def load_unread_count(user_id):
+    """COUNT(*) of unread notifications; used only to fill and reconcile the counter cache"""
+    cur = mysql.connection.cursor()
+    try:
+        cur.execute("SELECT COUNT(*) as count FROM user_notifications WHERE user_id = %s AND is_read = FALSE",
+                    (user_id,))
+        result = cur.fetchone()
+        return result['count'] if result else 0
+    finally:
+        cur.close()
+
+
+# Per-user unread counts, reconciled against the database every UNREAD_RECONCILE_SECONDS
+unread_counter = UnreadCounter(load_unread_count,
+                               reconcile_seconds=int(os.getenv("UNREAD_RECONCILE_SECONDS", 300)))
+
+
+def sync_unread(user_id):
+    """After an unread change: bump the ETag version and push the cached count to open streams"""
+    data_versions.bump(user_id, "unread")
+    try:
+        event_hub.publish(user_id, "unread", {"count": unread_counter.get(user_id)})
+    except Exception as e:
+        print(f"Error publishing unread count: {e}")
+
 
 @app.context_processor
 def inject_notifications():
     """Provides unread notification count to all templates globally."""
     if "user_id" in session:
-        cur = mysql.connection.cursor()
-        cur.execute("SELECT COUNT(*) as count FROM user_notifications WHERE user_id = %s AND is_read = FALSE",
-                    (session['user_id'],))
-        result = cur.fetchone()
-        cur.close()
-        return dict(unread_count=result['count'] if result else 0)
+        return dict(unread_count=unread_counter.get(session['user_id']))
     return dict(unread_count=0)
 
 
 # --- Routes ---
 
-@app.route("/notifications")
-@login_required
-def notifications():
-    user_id = session.get("user_id")
+NOTIFICATION_EVENT_TYPES = {'low_moisture', 'critical_moisture', 'auto_watering', 'watering_complete',
+                            'manual_watering', 'manual_stop', 'threshold_update', 'system'}
+NOTIFICATION_PAGE_SIZE = 50
+
+
+def parse_notification_filters(args):
+    """Filters from query args or a JSON object: event_type, plant_id (or "none"), is_read, older_than_days"""
+    filters = {}
+    event_type = args.get("event_type")
+    if event_type in NOTIFICATION_EVENT_TYPES:
+        filters["event_type"] = event_type
+
+    plant_id = str(args.get("plant_id") or "")
+    if plant_id == "none":
+        filters["plant_id"] = None
+    elif plant_id.isdigit():
+        filters["plant_id"] = int(plant_id)
+
+    is_read = str(args.get("is_read")).lower()
+    if is_read in ("true", "false"):
+        filters["is_read"] = is_read == "true"
+
+    older_than_days = str(args.get("older_than_days") or "")
+    if older_than_days.isdigit():
+        filters["older_than_days"] = int(older_than_days)
+    return filters
+
+
+def notification_filter_clauses(user_id, filters, prefix=""):
+    """WHERE clauses and params for ``filters``, always scoped to ``user_id``"""
+    clauses = [f"{prefix}user_id = %s"]
+    params = [user_id]
+    if "is_read" in filters:
+        clauses.append(f"{prefix}is_read = %s")
+        params.append(filters["is_read"])
+    if "event_type" in filters:
+        clauses.append(f"{prefix}event_type = %s")
+        params.append(filters["event_type"])
+    if "plant_id" in filters:
+        if filters["plant_id"] is None:
+            clauses.append(f"{prefix}plant_id IS NULL")
+        else:
+            clauses.append(f"{prefix}plant_id = %s")
+            params.append(filters["plant_id"])
+    if "older_than_days" in filters:
+        clauses.append(f"{prefix}created_at < NOW() - INTERVAL %s DAY")
+        params.append(filters["older_than_days"])
+    return clauses, params
+
+
+def encode_notification_cursor(row):
+    return f"{row['created_at'].isoformat()}_{row['id']}"
+
+
+def decode_notification_cursor(cursor):
+    created_at, note_id = cursor.rsplit("_", 1)
+    return datetime.fromisoformat(created_at), int(note_id)
+
+
+def fetch_notification_page(user_id, filters, cursor=None, limit=NOTIFICATION_PAGE_SIZE):
+    """One keyset page ordered by (created_at, id) descending. Returns (rows, next_cursor)."""
+    clauses, params = notification_filter_clauses(user_id, filters, prefix="n.")
+    if cursor:
+        created_at, note_id = decode_notification_cursor(cursor)
+        clauses.append("(n.created_at < %s OR (n.created_at = %s AND n.id < %s))")
+        params.extend([created_at, created_at, note_id])
+
     cur = mysql.connection.cursor()
     try:
-        # Fetch the 50 most recent notifications without changing their read status
-        cur.execute("""
+        # Fetch one extra row to learn whether another page exists
+        cur.execute(f"""
                     SELECT n.*, p.name as plant_name
                     FROM user_notifications n
                              LEFT JOIN plants p ON n.plant_id = p.id
-                    WHERE n.user_id = %s
-                    ORDER BY n.created_at DESC LIMIT 50
-                    """, (user_id,))
-        user_notifications = cur.fetchall()
+                    WHERE {' AND '.join(clauses)}
+                    ORDER BY n.created_at DESC, n.id DESC
+                    LIMIT %s
+                    """, tuple(params) + (limit + 1,))
+        rows = list(cur.fetchall())
+    finally:
+        cur.close()
 
-        return render_template("notifications.html",
-                               active_page="notifications",
-                               notifications=user_notifications)
+    next_cursor = encode_notification_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+@app.route("/notifications")
+@login_required
+def notifications():
+    user_id = session.get("user_id")
+    # First page only, without changing read status; further pages load from /api/notifications
+    user_notifications, next_cursor = fetch_notification_page(user_id, {})
+
+    cur = mysql.connection.cursor()
+    try:
+        cur.execute("SELECT id, name FROM plants WHERE user_id = %s ORDER BY name", (user_id,))
+        user_plants = cur.fetchall()
     finally:
         cur.close()
 
+    return render_template("notifications.html",
+                           active_page="notifications",
+                           notifications=user_notifications,
+                           plants=user_plants,
+                           next_cursor=next_cursor)
+
+
+@app.route("/api/notifications")
+@login_required
+def list_notifications():
+    """Keyset-paginated notifications with server-side filtering"""
+    try:
+        limit = min(max(int(request.args.get("limit", NOTIFICATION_PAGE_SIZE)), 1), 200)
+        rows, next_cursor = fetch_notification_page(session['user_id'],
+                                                    parse_notification_filters(request.args),
+                                                    request.args.get("cursor"),
+                                                    limit)
+    except ValueError:
+        return {"status": "error", "message": "Invalid cursor or limit"}, 400
+
+    payload = {
+        "status": "success",
+        "notifications": [
+            {
+                "id": row['id'],
+                "plant_id": row['plant_id'],
+                "plant_name": row['plant_name'],
+                "title": row['title'],
+                "message": row['message'],
+                "event_type": row['event_type'],
+                "is_read": bool(row['is_read']),
+                "occurrences": row.get('occurrences', 1),
+                "created_at": row['created_at'].isoformat() if row['created_at'] else None,
+                "last_seen_at": row['last_seen_at'].isoformat() if row.get('last_seen_at') else None
+            }
+            for row in rows
+        ],
+        "next_cursor": next_cursor
+    }
+    # The notifications page appends server-rendered cards to keep one card template
+    if request.args.get("include_html"):
+        payload["html"] = render_template("components/notification_card.html", notifications=rows)
+    return jsonify(payload)
+
 
 @app.route("/api/unread-count")
 @login_required
 def get_unread_count():
-    cur = mysql.connection.cursor()
-    cur.execute("SELECT COUNT(*) as count FROM user_notifications WHERE user_id = %s AND is_read = FALSE",
-                (session['user_id'],))
-    result = cur.fetchone()
-    cur.close()
-    return {"count": result['count'] if result else 0}
+    # Answer unchanged polls from the in-memory version without a query
+    etag = data_versions.etag(session['user_id'], "unread")
+    if request.if_none_match.contains(etag):
+        return not_modified(etag)
+
+    response = jsonify({"count": unread_counter.get(session['user_id'])})
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+@app.route("/api/stream")
+@login_required
+def event_stream():
+    """Server-Sent Events: moisture, pump and unread-count updates for the current user"""
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get("lastEventId")
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+
+    user_id = session['user_id']
+    try:
+        q, backlog = event_hub.subscribe(user_id, last_event_id)
+    except StreamLimitReached:
+        # EventSource gives up on a non-200 answer and the page falls back to polling
+        return Response("Too many live streams; poll instead", status=503, headers={"Retry-After": "60"})
+
+    response = Response(event_hub.stream(user_id, q, backlog),
+                        mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    response.call_on_close(lambda: event_hub.unsubscribe(user_id, q))
+    return response
 
 
 # --- Notification Management Routes ---
 
+NOTIFICATION_BULK_ACTIONS = {
+    "mark_read": ("UPDATE user_notifications SET is_read = TRUE", False),
+    "mark_unread": ("UPDATE user_notifications SET is_read = FALSE", True),
+    "delete": ("DELETE FROM user_notifications", None),
+}
+# Rows touched per statement; each chunk commits on its own so row locks stay short
+NOTIFICATION_BULK_CHUNK = int(os.getenv("NOTIFICATION_BULK_CHUNK", 1000))
+# Larger selections should use a filter instead of an id list
+NOTIFICATION_BULK_MAX_IDS = int(os.getenv("NOTIFICATION_BULK_MAX_IDS", 100000))
+
+
+def parse_notification_ids(values):
+    """Distinct positive integer ids from client input, preserving order.
+
+    Raises ValueError if more than NOTIFICATION_BULK_MAX_IDS values are sent.
+    """
+    values = values or []
+    if not isinstance(values, list):
+        values = [values]
+    if len(values) > NOTIFICATION_BULK_MAX_IDS:
+        raise ValueError(f"At most {NOTIFICATION_BULK_MAX_IDS} notification IDs per request; use a filter instead")
+    ids = []
+    seen = set()
+    for value in values:
+        value = str(value)
+        if value.isdigit():
+            value = int(value)
+            if value not in seen:
+                seen.add(value)
+                ids.append(value)
+    return ids
+
+
+def run_notification_bulk(user_id, action, ids=None, filters=None):
+    """Apply ``action`` to the given ids, or to every row matching ``filters``.
+
+    Work runs as a series of single statements of at most NOTIFICATION_BULK_CHUNK
+    rows, each committed separately. Read-state changes only match rows whose
+    state actually changes, so ``cur.rowcount`` is the exact affected count and
+    a predicate run stops once a chunk comes back short. Returns that count.
+    """
+    statement, only_read_state = NOTIFICATION_BULK_ACTIONS[action]
+    affected = 0
+    cur = mysql.connection.cursor()
+    try:
+        if ids is not None:
+            for start in range(0, len(ids), NOTIFICATION_BULK_CHUNK):
+                chunk = ids[start:start + NOTIFICATION_BULK_CHUNK]
+                clauses = [f"id IN ({','.join(['%s'] * len(chunk))})", "user_id = %s"]
+                params = list(chunk) + [user_id]
+                if only_read_state is not None:
+                    clauses.append("is_read = %s")
+                    params.append(only_read_state)
+                cur.execute(f"{statement} WHERE {' AND '.join(clauses)}", tuple(params))
+                mysql.connection.commit()
+                affected += cur.rowcount
+        else:
+            filters = dict(filters or {})
+            if only_read_state is not None:
+                if filters.get("is_read", only_read_state) != only_read_state:
+                    return 0
+                filters["is_read"] = only_read_state
+            clauses, params = notification_filter_clauses(user_id, filters)
+            while True:
+                cur.execute(f"{statement} WHERE {' AND '.join(clauses)} LIMIT %s",
+                            tuple(params) + (NOTIFICATION_BULK_CHUNK,))
+                mysql.connection.commit()
+                affected += cur.rowcount
+                if cur.rowcount < NOTIFICATION_BULK_CHUNK:
+                    break
+    finally:
+        cur.close()
+        # Earlier chunks are committed even if a later one fails
+        if action == "mark_read":
+            unread_counter.adjust(user_id, -affected)
+        elif action == "mark_unread":
+            unread_counter.adjust(user_id, affected)
+        elif ids is None and not filters:
+            unread_counter.set(user_id, 0)
+        elif not (ids is None and filters.get("is_read")):
+            # Whether deleted rows were unread is unknown; reconcile on next read
+            unread_counter.invalidate(user_id)
+        if affected:
+            sync_unread(user_id)
+    return affected
+
+
+@app.route("/api/notifications/bulk", methods=["POST"])
+@login_required
+def bulk_notifications():
+    """Bulk mark-read, mark-unread or delete by id list or by filter predicate.
+
+    Body: {"action": "delete", "ids": [1, 2]} or
+          {"action": "delete", "filter": {"event_type": "low_moisture", "older_than_days": 7}}
+    An empty filter object selects every notification of the user.
+    """
+    data = request.get_json(silent=True) or {}
+    action = data.get("action")
+    if action not in NOTIFICATION_BULK_ACTIONS:
+        return {"status": "error", "message": f"Unknown action: {action}"}, 400
+
+    if "ids" in data:
+        try:
+            ids, filters = parse_notification_ids(data.get("ids")), None
+        except ValueError as e:
+            return {"status": "error", "message": str(e)}, 400
+        if not ids:
+            return {"status": "error", "message": "No notification IDs provided"}, 400
+    elif isinstance(data.get("filter"), dict):
+        ids, filters = None, parse_notification_filters(data["filter"])
+    else:
+        return {"status": "error", "message": "Provide either ids or filter"}, 400
+
+    try:
+        count = run_notification_bulk(session['user_id'], action, ids=ids, filters=filters)
+        return {"status": "success", "action": action, "count": count}
+    except Exception as e:
+        print(f"Error in bulk_notifications: {str(e)}")
+        mysql.connection.rollback()
+        return {"status": "error", "message": str(e)}, 500
+
+
+def bulk_request_ids():
+    """Notification ids from a JSON body or form data"""
+    if request.is_json:
+        return parse_notification_ids((request.get_json(silent=True) or {}).get('notification_ids'))
+    return parse_notification_ids(request.form.getlist('notification_ids'))
+
+
 @app.route("/notifications/mark-read/<int:note_id>", methods=["POST"])
 @login_required
 def mark_notification_read(note_id):
     cur = None
     try:
         cur = mysql.connection.cursor()
-        cur.execute("UPDATE user_notifications SET is_read = TRUE WHERE id = %s AND user_id = %s",
+        cur.execute("UPDATE user_notifications SET is_read = TRUE WHERE id = %s AND user_id = %s AND is_read = FALSE",
                     (note_id, session['user_id']))
         mysql.connection.commit()
+        unread_counter.adjust(session['user_id'], -cur.rowcount)
+        sync_unread(session['user_id'])
         return {"status": "success", "message": "Notification marked as read", "note_id": note_id}
     except Exception as e:
         print(f"Error in mark_notification_read: {str(e)}")
@@ -686,9 +1437,11 @@ def mark_notification_unread(note_id):
     cur = None
     try:
         cur = mysql.connection.cursor()
-        cur.execute("UPDATE user_notifications SET is_read = FALSE WHERE id = %s AND user_id = %s",
+        cur.execute("UPDATE user_notifications SET is_read = FALSE WHERE id = %s AND user_id = %s AND is_read = TRUE",
                     (note_id, session['user_id']))
         mysql.connection.commit()
+        unread_counter.adjust(session['user_id'], cur.rowcount)
+        sync_unread(session['user_id'])
         return {"status": "success", "message": "Notification marked as unread", "note_id": note_id}
     except Exception as e:
         print(f"Error in mark_notification_unread: {str(e)}")
@@ -702,24 +1455,13 @@ def mark_notification_unread(note_id):
 @app.route("/notifications/mark-all-read", methods=["POST"])
 @login_required
 def mark_all_notifications_read():
-    cur = None
     try:
-        cur = mysql.connection.cursor()
-        cur.execute("UPDATE user_notifications SET is_read = TRUE WHERE user_id = %s", (session['user_id'],))
-        mysql.connection.commit()
-
-        # Get count of updated notifications
-        cur.execute("SELECT COUNT(*) as count FROM user_notifications WHERE user_id = %s", (session['user_id'],))
-        count = cur.fetchone()['count']
-
-        return {"status": "success", "message": f"All notifications marked as read", "count": count}
+        count = run_notification_bulk(session['user_id'], "mark_read", filters={})
+        return {"status": "success", "message": "All notifications marked as read", "count": count}
     except Exception as e:
         print(f"Error in mark_all_notifications_read: {str(e)}")
         mysql.connection.rollback()
         return {"status": "error", "message": str(e)}, 500
-    finally:
-        if cur:
-            cur.close()
 
 
 @app.route("/notifications/delete/<int:note_id>", methods=["POST"])
@@ -730,6 +1472,9 @@ def delete_notification(note_id):
         cur = mysql.connection.cursor()
         cur.execute("DELETE FROM user_notifications WHERE id = %s AND user_id = %s", (note_id, session['user_id']))
         mysql.connection.commit()
+        # Whether the deleted row was unread is unknown; reconcile on next read
+        unread_counter.invalidate(session['user_id'])
+        sync_unread(session['user_id'])
         return {"status": "success", "message": "Notification deleted", "note_id": note_id}
     except Exception as e:
         print(f"Error in delete_notification: {str(e)}")
@@ -743,115 +1488,67 @@ def delete_notification(note_id):
 @app.route("/notifications/delete-bulk", methods=["POST"])
 @login_required
 def delete_notifications_bulk():
-    cur = None
     try:
-        ids = request.form.getlist('notification_ids')
-        if not ids:
-            return {"status": "error", "message": "No notification IDs provided"}, 400
-
-        cur = mysql.connection.cursor()
-        format_strings = ','.join(['%s'] * len(ids))
-        cur.execute(f"DELETE FROM user_notifications WHERE id IN ({format_strings}) AND user_id = %s",
-                    tuple(ids) + (session['user_id'],))
-        mysql.connection.commit()
-        return {"status": "success", "message": f"Successfully deleted {len(ids)} notifications", "count": len(ids)}
+        ids = bulk_request_ids()
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}, 400
+    if not ids:
+        return {"status": "error", "message": "No notification IDs provided"}, 400
+    try:
+        count = run_notification_bulk(session['user_id'], "delete", ids=ids)
+        return {"status": "success", "message": f"Successfully deleted {count} notifications", "count": count}
     except Exception as e:
         print(f"Error in delete_notifications_bulk: {str(e)}")
         mysql.connection.rollback()
         return {"status": "error", "message": str(e)}, 500
-    finally:
-        if cur:
-            cur.close()
 
 
 @app.route("/notifications/mark-bulk-read", methods=["POST"])
 @login_required
 def mark_notifications_bulk_read():
-    cur = None
     try:
-        # Support both JSON and form data
-        if request.is_json:
-            data = request.get_json()
-            if not data:
-                return {"status": "error", "message": "No data provided"}, 400
-            ids = data.get('notification_ids', [])
-        else:
-            ids = request.form.getlist('notification_ids')
-
-        if not ids:
-            return {"status": "error", "message": "No notification IDs provided"}, 400
-
-        cur = mysql.connection.cursor()
-        placeholders = ','.join(['%s'] * len(ids))
-        query = f"UPDATE user_notifications SET is_read = TRUE WHERE id IN ({placeholders}) AND user_id = %s"
-        params = tuple(ids) + (session['user_id'],)
-
-        cur.execute(query, params)
-        mysql.connection.commit()
-        return {"status": "success", "message": f"Marked {len(ids)} notifications as read", "count": len(ids)}
+        ids = bulk_request_ids()
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}, 400
+    if not ids:
+        return {"status": "error", "message": "No notification IDs provided"}, 400
+    try:
+        count = run_notification_bulk(session['user_id'], "mark_read", ids=ids)
+        return {"status": "success", "message": f"Marked {count} notifications as read", "count": count}
     except Exception as e:
         print(f"Error in mark_notifications_bulk_read: {str(e)}")
         mysql.connection.rollback()
         return {"status": "error", "message": str(e)}, 500
-    finally:
-        if cur:
-            cur.close()
 
 
 @app.route("/notifications/mark-bulk-unread", methods=["POST"])
 @login_required
 def mark_notifications_bulk_unread():
-    cur = None
     try:
-        # Support both JSON and form data
-        if request.is_json:
-            data = request.get_json()
-            if not data:
-                return {"status": "error", "message": "No data provided"}, 400
-            ids = data.get('notification_ids', [])
-        else:
-            ids = request.form.getlist('notification_ids')
-
-        if not ids:
-            return {"status": "error", "message": "No notification IDs provided"}, 400
-
-        cur = mysql.connection.cursor()
-        format_strings = ','.join(['%s'] * len(ids))
-        cur.execute(f"UPDATE user_notifications SET is_read = FALSE WHERE id IN ({format_strings}) AND user_id = %s",
-                    tuple(ids) + (session['user_id'],))
-        mysql.connection.commit()
-        return {"status": "success", "message": f"Marked {len(ids)} notifications as unread", "count": len(ids)}
+        ids = bulk_request_ids()
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}, 400
+    if not ids:
+        return {"status": "error", "message": "No notification IDs provided"}, 400
+    try:
+        count = run_notification_bulk(session['user_id'], "mark_unread", ids=ids)
+        return {"status": "success", "message": f"Marked {count} notifications as unread", "count": count}
     except Exception as e:
         print(f"Error in mark_notifications_bulk_unread: {str(e)}")
         mysql.connection.rollback()
         return {"status": "error", "message": str(e)}, 500
-    finally:
-        if cur:
-            cur.close()
 
 
 @app.route("/notifications/delete-all", methods=["POST"])
 @login_required
 def delete_all_notifications():
-    cur = None
     try:
-        cur = mysql.connection.cursor()
-        # Get count before deletion for message
-        cur.execute("SELECT COUNT(*) as count FROM user_notifications WHERE user_id = %s", (session['user_id'],))
-        count_result = cur.fetchone()
-        count = count_result['count'] if count_result else 0
-
-        # Delete all notifications
-        cur.execute("DELETE FROM user_notifications WHERE user_id = %s", (session['user_id'],))
-        mysql.connection.commit()
-        return {"status": "success", "message": f"Deleted all notifications", "count": count}
+        count = run_notification_bulk(session['user_id'], "delete", filters={})
+        return {"status": "success", "message": "Deleted all notifications", "count": count}
     except Exception as e:
         print(f"Error in delete_all_notifications: {str(e)}")
         mysql.connection.rollback()
         return {"status": "error", "message": str(e)}, 500
-    finally:
-        if cur:
-            cur.close()
 
 
 @app.route("/update-threshold/<int:plant_id>", methods=["POST"])
@@ -864,6 +1561,7 @@ def update_threshold(plant_id):
         cur.execute("UPDATE plants SET moisture_threshold = %s WHERE id = %s AND user_id = %s",
                     (new_threshold, plant_id, session['user_id']))
         mysql.connection.commit()
+        plant_registry.invalidate()
 
         # Trigger notification for threshold change
         create_notification(
@@ -879,9 +1577,12 @@ def update_threshold(plant_id):
 @app.route("/toggle-pump/<int:plant_id>", methods=["POST"])
 @login_required
 def toggle_pump(plant_id):
-    data = request.get_json()
+    data = request.get_json(silent=True) or {}
     is_active = data.get('active', False)
-    duration = data.get('duration', 10)
+    duration = data.get('duration') or get_watering_duration(plant_id)
+    if isinstance(duration, bool) or not isinstance(duration, (int, float)) \
+            or not math.isfinite(duration) or duration <= 0:
+        return {"status": "error", "message": "duration must be a positive number of seconds"}, 400
 
     cur = mysql.connection.cursor()
     try:
@@ -894,7 +1595,7 @@ def toggle_pump(plant_id):
 
         # 2. Hardware Command (PubNub)
         command = "PUMP_ON" if is_active else "PUMP_OFF"
-        pubnub.publish().channel("pump-commands").message({
+        get_pubnub().publish().channel("pump-commands").message({
             "command": command,
             "plant_id": plant_id,
             "plant_name": plant['name'],
@@ -903,6 +1604,16 @@ def toggle_pump(plant_id):
             "timestamp": datetime.now().isoformat()
         }).sync()
 
+        # State only changes once the command is out, so a failed publish leaves it untouched
+        if is_active:
+            pump_states.begin_watering(plant_id)
+            # Arm the pump-off before any DB work; a manual run while a deadline is pending extends it
+            if not pump_scheduler.extend(plant_id, duration):
+                pump_scheduler.schedule(plant_id, duration, send_pump_off_command, plant_id, plant['name'])
+        else:
+            pump_states.finish_watering(plant_id)
+            pump_scheduler.cancel(plant_id)
+
         if is_active:
             title = "Manual Watering Started"
             message = f"Irrigation for {plant['name']} triggered manually for {duration} seconds."
@@ -914,12 +1625,10 @@ def toggle_pump(plant_id):
 
         create_notification(session['user_id'], plant_id, title, message, event_type)
 
-        cur.execute("""
-                    INSERT INTO moisture_readings (plant_id, pump_status, is_automated)
-                    VALUES (%s, %s, FALSE)
-                    """, (plant_id, is_active))
+        record_pump_event(cur, plant_id, is_active, False)
 
         mysql.connection.commit()
+
         return {"status": "success"}
 
     except Exception as e:
@@ -929,20 +1638,6 @@ def toggle_pump(plant_id):
         cur.close()
 
 
-def send_pump_off_command(plant_id, plant_name):
-    """Helper function to send pump off command after duration"""
-    try:
-        pubnub.publish().channel("pump-commands").message({
-            "command": "PUMP_OFF",
-            "plant_id": plant_id,
-            "plant_name": plant_name,
-            "reason": "manual_complete",
-            "timestamp": datetime.now().isoformat()
-        }).sync()
-    except Exception as e:
-        print(f"Error sending pump off command: {e}")
-
-
 # --- Dashboard & Plant Management ---
 @app.route("/dashboard")
 @login_required
@@ -951,26 +1646,13 @@ def dashboard():
     cur = mysql.connection.cursor()
 
     try:
-        # Get plants with their latest moisture readings
+        # Get plants with their latest moisture readings from the summary table
         cur.execute("""
                     SELECT p.*,
-                           COALESCE(
-                                   (SELECT m.moisture_level
-                                    FROM moisture_readings m
-                                    WHERE m.plant_id = p.id
-                                    ORDER BY m.recorded_at DESC
-                                   LIMIT 1), 
-                    0
-                )                                           as last_moisture,
-                           COALESCE(
-                                   (SELECT m.recorded_at
-                                    FROM moisture_readings m
-                                    WHERE m.plant_id = p.id
-                                    ORDER BY m.recorded_at DESC
-                                   LIMIT 1), 
-                    p.created_at
-                ) as last_update
+                           COALESCE(l.moisture_level, 0)         as last_moisture,
+                           COALESCE(l.recorded_at, p.created_at) as last_update
                     FROM plants p
+                             LEFT JOIN plant_latest l ON l.plant_id = p.id
                     WHERE p.user_id = %s
                     ORDER BY p.id
                     """, (user_id,))
@@ -996,23 +1678,30 @@ def dashboard():
 def get_latest_moisture():
     """Get latest moisture readings for all user's plants"""
     user_id = session.get("user_id")
+
+    # Answer unchanged polls from the in-memory version without a query
+    etag = data_versions.etag(user_id, "moisture")
+    if request.if_none_match.contains(etag):
+        return not_modified(etag)
+
     cur = mysql.connection.cursor()
 
     try:
         # Get plants with their latest moisture data
         cur.execute("""
-                    SELECT p.id                         as plant_id,
+                    SELECT p.id                           as plant_id,
                            p.name,
-                           COALESCE(p.last_moisture, 0) as moisture,
-                           p.last_update as timestamp
+                           COALESCE(l.moisture_level, 0)  as moisture,
+                           l.recorded_at                  as timestamp
                     FROM plants p
+                             LEFT JOIN plant_latest l ON l.plant_id = p.id
                     WHERE p.user_id = %s
                     ORDER BY p.id
                     """, (user_id,))
 
         updates = cur.fetchall()
 
-        return jsonify({
+        response = jsonify({
             "success": True,
             "updates": [
                 {
@@ -1024,6 +1713,9 @@ def get_latest_moisture():
                 for row in updates
             ]
         })
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "private, no-cache"
+        return response
     except Exception as e:
         print(f"Error in get_latest_moisture: {e}")
         return jsonify({"success": False, "error": str(e)}), 500
@@ -1031,6 +1723,29 @@ def get_latest_moisture():
         cur.close()
 
 
+@app.route("/api/system-stats")
+@login_required
+def get_system_stats():
+    """Expose ingest backpressure, connection pool and background service metrics (admins only)"""
+    if session.get('role') != 'admin':
+        return {"status": "error", "message": "Forbidden"}, 403
+    return jsonify({
+        "ingest": dict(moisture_listener.ingest.stats(), out_of_range=moisture_listener.out_of_range),
+        "db_pool": mysql.pool.stats(),
+        "registry": plant_registry.stats(),
+        "pumps": pump_states.snapshot(),
+        "scheduler": pump_scheduler.stats(),
+        "maintenance": maintenance_scheduler.stats(),
+        "retention": retention.stats(),
+        "events": event_hub.stats(),
+        "unread_counter": unread_counter.stats(),
+        "alerts": alert_coalescer.stats(),
+        "ai_advice_cache": advice_cache.stats(),
+        "ai_jobs": ai_jobs.stats(),
+        "ai": ai_analyzer.stats()
+    })
+
+
 @app.route("/plant/<int:plant_id>")
 @login_required
 def plant_detail(plant_id):
@@ -1044,30 +1759,215 @@ def plant_detail(plant_id):
 
     cur.execute("""
                 SELECT moisture_level, recorded_at
-                FROM moisture_readings
+                FROM plant_latest
                 WHERE plant_id = %s
-                ORDER BY recorded_at DESC LIMIT 1
                 """, (plant_id,))
     last_reading = cur.fetchone()
     cur.close()
     return render_template("plant_detail.html", plant=plant, last_reading=last_reading)
 
 
+HISTORY_DEFAULT_BUCKETS = 200
+HISTORY_MAX_BUCKETS = 1000
+
+
+def parse_history_time(value):
+    """Naive local datetime from an ISO 8601 query value; offsets such as ``Z`` are converted"""
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed
+
+
+def query_history(plant_id, source, start, end, width):
+    """Per-bucket min/max/avg/count (and pump-on seconds from rollups), grouped in SQL"""
+    if source == "moisture_readings":
+        time_col = "recorded_at"
+        aggregates = """MIN(moisture_level) AS min_level, MAX(moisture_level) AS max_level,
+                        AVG(moisture_level) AS avg_level, COUNT(moisture_level) AS sample_count,
+                        NULL AS pump_on_seconds"""
+    else:
+        time_col = "bucket_start"
+        aggregates = """MIN(min_level) AS min_level, MAX(max_level) AS max_level,
+                        SUM(avg_level * sample_count) / NULLIF(SUM(sample_count), 0) AS avg_level,
+                        SUM(sample_count) AS sample_count, SUM(pump_on_seconds) AS pump_on_seconds"""
+
+    cur = mysql.connection.cursor()
+    try:
+        cur.execute(f"""
+                    SELECT FLOOR((UNIX_TIMESTAMP({time_col}) - UNIX_TIMESTAMP(%s)) / %s) AS bucket,
+                           {aggregates}
+                    FROM {source}
+                    WHERE plant_id = %s AND {time_col} >= %s AND {time_col} < %s
+                    GROUP BY bucket
+                    ORDER BY bucket
+                    """, (start, width, plant_id, start, end))
+        return cur.fetchall()
+    finally:
+        cur.close()
+
+
+@app.route("/api/plants/<int:plant_id>/history")
+@login_required
+def get_plant_history(plant_id):
+    """Downsampled moisture history: at most ``buckets`` points between ``from`` and ``to``.
+
+    Each point keeps the bucket's min and max next to the average so short
+    dry spells and watering spikes survive downsampling. Buckets are computed
+    in the database from the coarsest table that still resolves them.
+    """
+    plant = plant_registry.get_by_id(plant_id)
+    if not plant or plant['user_id'] != session['user_id']:
+        return {"status": "error", "message": "Plant not found"}, 404
+
+    now = datetime.now()
+    try:
+        end = parse_history_time(request.args["to"]) if request.args.get("to") else now
+        start = parse_history_time(request.args["from"]) if request.args.get("from") else end - timedelta(days=1)
+        buckets = min(max(int(request.args.get("buckets", HISTORY_DEFAULT_BUCKETS)), 1), HISTORY_MAX_BUCKETS)
+    except ValueError:
+        return {"status": "error", "message": "Invalid from, to or buckets"}, 400
+    if start >= end:
+        return {"status": "error", "message": "from must be before to"}, 400
+
+    width = max(1, math.ceil((end - start).total_seconds() / buckets))
+    source = retention.source_for(start, now, width)
+    rows = query_history(plant_id, source, start, end, width)
+    # Rollups lag raw data until the first retention pass; raw rows still cover recent ranges
+    if not rows and source != "moisture_readings" and start >= now - timedelta(days=retention.raw_days):
+        source = "moisture_readings"
+        rows = query_history(plant_id, source, start, end, width)
+
+    points = []
+    for row in rows:
+        points.append({
+            "t": (start + timedelta(seconds=int(row['bucket']) * width)).isoformat(),
+            "min": float(row['min_level']) if row['min_level'] is not None else None,
+            "max": float(row['max_level']) if row['max_level'] is not None else None,
+            "avg": round(float(row['avg_level']), 2) if row['avg_level'] is not None else None,
+            "count": int(row['sample_count'] or 0),
+            "pump_on_seconds": float(row['pump_on_seconds']) if row['pump_on_seconds'] is not None else None
+        })
+
+    return jsonify({
+        "status": "success",
+        "plant_id": plant_id,
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "bucket_seconds": width,
+        "source": source,
+        "points": points
+    })
+
+
+def load_cached_advice(key):
+    cur = mysql.connection.cursor()
+    try:
+        cur.execute("""
+                    SELECT advice, TIMESTAMPDIFF(SECOND, created_at, NOW()) AS age
+                    FROM ai_advice_cache
+                    WHERE cache_key = %s AND created_at > NOW() - INTERVAL %s SECOND
+                    """, (key, advice_cache.ttl_seconds))
+        row = cur.fetchone()
+    finally:
+        cur.close()
+    return (json.loads(row['advice']), row['age']) if row else None
+
+
+def store_cached_advice(key, plant_id, advice):
+    cur = mysql.connection.cursor()
+    try:
+        cur.execute("""
+                    INSERT INTO ai_advice_cache (cache_key, plant_id, advice)
+                    VALUES (%s, %s, %s)
+                    ON DUPLICATE KEY UPDATE advice = VALUES(advice), created_at = CURRENT_TIMESTAMP
+                    """, (key, plant_id, json.dumps(advice)))
+        # Piggyback a bounded purge of expired rows on each write
+        cur.execute("DELETE FROM ai_advice_cache WHERE created_at < NOW() - INTERVAL %s SECOND LIMIT 100",
+                    (advice_cache.ttl_seconds,))
+        mysql.connection.commit()
+    finally:
+        cur.close()
+
+
+# Care advice keyed by (name, location, environment, moisture band); memory LRU over a durable table
+advice_cache = AdviceCache(load_cached_advice, store_cached_advice,
+                           ttl_seconds=int(os.getenv("AI_ADVICE_TTL_SECONDS", 7 * 86400)),
+                           max_entries=int(os.getenv("AI_ADVICE_CACHE_SIZE", 512)),
+                           band_width=int(os.getenv("AI_ADVICE_MOISTURE_BAND", 10)))
+
+
+# One configured Gemini client for the process, with timeouts, retries and a circuit breaker
+ai_analyzer = PlantCareAIAnalyzer(timeout=float(os.getenv("AI_TIMEOUT_SECONDS", 20)),
+                                  max_retries=int(os.getenv("AI_MAX_RETRIES", 2)),
+                                  failure_threshold=int(os.getenv("AI_BREAKER_FAILURES", 5)),
+                                  reset_seconds=int(os.getenv("AI_BREAKER_RESET_SECONDS", 60)))
+
+
+def generate_advice(plant_id, plant_data, key, user_id):
+    """AI job body: stream the model's answer to the user, then write it through the cache"""
+    def publish_partial(fields):
+        event_hub.publish(user_id, "ai_advice_partial", {"plant_id": plant_id, "fields": fields})
+
+    advice, complete = ai_analyzer.get_care_advice(plant_data, on_partial=publish_partial)
+
+    # Fallback or partly filled-in advice must not be pinned for the whole TTL
+    if complete:
+        with app.app_context():
+            try:
+                advice_cache.put(key, plant_id, advice)
+            except Exception as e:
+                print(f"Could not cache AI advice for plant {plant_id}: {e}")
+    return {"plant_id": plant_id, "advice": advice}
+
+
+def generate_batch_advice(plants, keys):
+    """AI job body for a whole garden: one model call per AI_BATCH_SIZE plants"""
+    advice_by_plant, complete_ids = ai_analyzer.get_batch_care_advice(
+        plants, max_per_call=int(os.getenv("AI_BATCH_SIZE", 10)))
+    with app.app_context():
+        for plant in plants:
+            advice = advice_by_plant[plant['id']]
+            if plant['id'] not in complete_ids:
+                continue
+            try:
+                advice_cache.put(keys[plant['id']], plant['id'], advice)
+            except Exception as e:
+                print(f"Could not cache AI advice for plant {plant['id']}: {e}")
+    return {"advice_by_plant": advice_by_plant}
+
+
+def ai_job_payload(job):
+    payload = {"job_id": job['id'], "status": job['status']}
+    if job['status'] == "done":
+        payload.update(job['result'])
+    elif job['status'] == "error":
+        payload["message"] = job['error']
+    return payload
+
+
+def publish_ai_job(job):
+    """Push a finished advice job to the requesting user's open pages"""
+    event_hub.publish(job['owner'], "ai_advice", ai_job_payload(job))
+
+
+# Model calls run here, never on request threads; same plant + inputs share one in-flight job
+ai_jobs = AIJobQueue(max_workers=int(os.getenv("AI_JOB_WORKERS", 2)),
+                     max_pending=int(os.getenv("AI_JOB_MAX_PENDING", 32)),
+                     on_complete=publish_ai_job)
+
+
 @app.route("/api/ai-tips/<int:plant_id>")
 @login_required
 def get_ai_tips(plant_id):
-    # This route interfaces with the PlantCareAIAnalyzer class logic
-    from Interface.src.ai_analyzer import PlantCareAIAnalyzer
-    analyzer = PlantCareAIAnalyzer()
-
+    """Cached advice immediately, otherwise a job id (202) to poll or await over the event stream"""
     cur = mysql.connection.cursor()
     cur.execute("""
-                SELECT p.*, m.moisture_level as last_moisture
+                SELECT p.*, l.moisture_level as last_moisture
                 FROM plants p
-                         LEFT JOIN moisture_readings m ON p.id = m.plant_id
+                         LEFT JOIN plant_latest l ON p.id = l.plant_id
                 WHERE p.id = %s
                   AND p.user_id = %s
-                ORDER BY m.recorded_at DESC LIMIT 1
                 """, (plant_id, session['user_id']))
     plant_data = cur.fetchone()
     cur.close()
@@ -1075,7 +1975,61 @@ def get_ai_tips(plant_id):
     if not plant_data:
         return {"error": "Plant not found"}, 404
 
-    return analyzer.get_care_advice(plant_data)
+    key = advice_cache.key(plant_data)
+    advice = advice_cache.get(key)
+    if advice is not None:
+        return {"status": "done", "plant_id": plant_id, "advice": advice}
+
+    try:
+        job = ai_jobs.submit(f"{plant_id}:{key}", session['user_id'], generate_advice,
+                             plant_id, plant_data, key, session['user_id'])
+    except JobQueueFull as e:
+        return {"status": "busy", "message": str(e)}, 503
+    return ai_job_payload(job), 202
+
+
+@app.route("/api/ai-tips/batch", methods=["POST"])
+@login_required
+def get_ai_tips_batch():
+    """Advice for all of the user's plants: cached entries now, the rest in one batched job"""
+    cur = mysql.connection.cursor()
+    cur.execute("""
+                SELECT p.*, l.moisture_level as last_moisture
+                FROM plants p
+                         LEFT JOIN plant_latest l ON p.id = l.plant_id
+                WHERE p.user_id = %s
+                """, (session['user_id'],))
+    plants = cur.fetchall()
+    cur.close()
+
+    cached, missing, keys = {}, [], {}
+    for plant in plants:
+        keys[plant['id']] = advice_cache.key(plant)
+        advice = advice_cache.get(keys[plant['id']])
+        if advice is not None:
+            cached[plant['id']] = advice
+        else:
+            missing.append(plant)
+
+    if not missing:
+        return {"status": "done", "advice_by_plant": cached}
+
+    batch_key = hashlib.sha256("".join(sorted(keys[p['id']] for p in missing)).encode()).hexdigest()
+    try:
+        job = ai_jobs.submit(f"batch:{session['user_id']}:{batch_key}", session['user_id'],
+                             generate_batch_advice, missing, keys)
+    except JobQueueFull as e:
+        return {"status": "busy", "message": str(e), "advice_by_plant": cached}, 503
+    return {**ai_job_payload(job), "advice_by_plant": cached}, 202
+
+
+@app.route("/api/ai-jobs/<job_id>")
+@login_required
+def get_ai_job(job_id):
+    job = ai_jobs.get(job_id)
+    if not job or job['owner'] != session['user_id']:
+        return {"status": "error", "message": "Job not found"}, 404
+    return ai_job_payload(job)
 
 
 @app.route("/update-plant-photo/<int:plant_id>", methods=["POST"])
@@ -1178,6 +2132,8 @@ def delete_profile():
             cur.execute("DELETE FROM user_notifications WHERE user_id = %s", (user_id,))
             cur.execute("DELETE FROM users WHERE id = %s", (user_id,))
             mysql.connection.commit()
+            plant_registry.invalidate()
+            unread_counter.invalidate(user_id)
             session.clear()
             flash("Termination Complete: Profile and botanical data purged.", "success")
             return redirect(url_for("index"))
@@ -1206,6 +2162,8 @@ def add_plant():
                     VALUES (%s, %s, %s, %s, %s)
                     """, (name, location, threshold, user_id, hardware_id))
         mysql.connection.commit()
+        data_versions.bump(session['user_id'], "moisture")
+        plant_registry.invalidate()
         flash("Ecosystem Updated: New botanical device synchronized.", "success")
     except Exception as e:
         flash("Configuration Error: Could not register device.", "error")
@@ -1232,6 +2190,8 @@ def delete_plant(plant_id):
     cur = mysql.connection.cursor()
     cur.execute("DELETE FROM plants WHERE id = %s AND user_id = %s", (plant_id, session['user_id']))
     mysql.connection.commit()
+    data_versions.bump(session['user_id'], "moisture")
+    plant_registry.invalidate()
     cur.close()
     flash("Plant removed from your garden.", "success")
     return redirect(url_for('dashboard'))
@@ -1254,6 +2214,8 @@ def update_plant_info(plant_id):
                       AND user_id = %s
                     """, (new_name, new_location, plant_id, session['user_id']))
         mysql.connection.commit()
+        data_versions.bump(session['user_id'], "moisture")
+        plant_registry.invalidate()
         return {"status": "success"}
     except Exception as e:
         return {"status": "error", "message": str(e)}, 500
@@ -1262,4 +2224,5 @@ def update_plant_info(plant_id):
 
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    # The debug reloader re-runs this file in a child process; only that child serves and owns services
+    create_app(start_services=os.environ.get("WERKZEUG_RUN_MAIN") == "true").run(debug=True)
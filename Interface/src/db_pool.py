@@ -0,0 +1,185 @@
+import queue
+import threading
+import time
+
+import MySQLdb
+import MySQLdb.cursors
+from flask import g, has_app_context
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection frees up within the pool's wait time."""
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of MySQLdb connections.
+
+    At most ``size`` connections exist at once. Idle connections are pinged
+    before reuse once they have sat longer than ``health_check_interval``
+    seconds, and connections that fail are discarded rather than returned.
+    """
+
+    def __init__(self, connect, size=10, timeout=5.0, health_check_interval=30.0):
+        self._connect = connect
+        self.size = size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+
+        self.in_use = 0
+        self.waiting = 0
+        self.created = 0
+        self.discarded = 0
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+
+    def acquire(self):
+        """Check out a healthy connection, waiting up to ``timeout`` seconds for a free slot."""
+        started = time.perf_counter()
+        with self._lock:
+            self.waiting += 1
+        got_slot = self._slots.acquire(timeout=self.timeout)
+        with self._lock:
+            self.waiting -= 1
+        if not got_slot:
+            with self._lock:
+                self.timeouts += 1
+            raise PoolTimeout(f"No database connection available within {self.timeout}s")
+
+        try:
+            conn = self._checkout_idle()
+            if conn is None:
+                conn = self._connect()
+                with self._lock:
+                    self.created += 1
+        except Exception:
+            self._slots.release()
+            raise
+
+        waited_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self.in_use += 1
+            self.checkouts += 1
+            self.total_wait_ms += waited_ms
+            self.max_wait_ms = max(self.max_wait_ms, waited_ms)
+        return conn
+
+    def _checkout_idle(self):
+        """Pop idle connections until one passes its health check."""
+        while True:
+            try:
+                conn, idle_since = self._idle.get_nowait()
+            except queue.Empty:
+                return None
+
+            if time.monotonic() - idle_since < self.health_check_interval:
+                return conn
+            try:
+                conn.ping()
+                return conn
+            except Exception:
+                self._close(conn)
+
+    def release(self, conn, discard=False):
+        """Return a connection, rolling back anything left uncommitted."""
+        try:
+            if not discard:
+                try:
+                    conn.rollback()
+                except Exception:
+                    discard = True
+
+            if discard:
+                self._close(conn)
+            else:
+                self._idle.put((conn, time.monotonic()))
+        finally:
+            with self._lock:
+                self.in_use -= 1
+            self._slots.release()
+
+    def _close(self, conn):
+        with self._lock:
+            self.discarded += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": self.size,
+                "in_use": self.in_use,
+                "idle": self._idle.qsize(),
+                "waiting": self.waiting,
+                "created": self.created,
+                "discarded": self.discarded,
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "avg_checkout_ms": round(self.total_wait_ms / self.checkouts, 3) if self.checkouts else 0,
+                "max_checkout_ms": round(self.max_wait_ms, 3),
+            }
+
+
+class PooledMySQL:
+    """Drop-in for flask_mysqldb.MySQL whose ``connection`` comes from a shared pool.
+
+    A connection is checked out on first use inside an app context (request
+    or ``with app.app_context()`` in a background thread) and returned when
+    that context tears down.
+    """
+
+    def __init__(self, app=None):
+        self.pool = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("MYSQL_PORT", 3306)
+        app.config.setdefault("MYSQL_CHARSET", "utf8mb4")
+        app.config.setdefault("MYSQL_POOL_SIZE", 10)
+        app.config.setdefault("MYSQL_POOL_TIMEOUT", 5.0)
+        app.config.setdefault("MYSQL_POOL_HEALTH_CHECK", 30.0)
+
+        config = app.config
+        cursorclass = getattr(MySQLdb.cursors, config.get("MYSQL_CURSORCLASS") or "Cursor")
+
+        def connect():
+            return MySQLdb.connect(
+                host=config.get("MYSQL_HOST") or "localhost",
+                user=config.get("MYSQL_USER"),
+                passwd=config.get("MYSQL_PASSWORD") or "",
+                db=config.get("MYSQL_DB"),
+                port=int(config["MYSQL_PORT"]),
+                charset=config["MYSQL_CHARSET"],
+                cursorclass=cursorclass,
+            )
+
+        self.pool = ConnectionPool(
+            connect,
+            size=int(config["MYSQL_POOL_SIZE"]),
+            timeout=float(config["MYSQL_POOL_TIMEOUT"]),
+            health_check_interval=float(config["MYSQL_POOL_HEALTH_CHECK"]),
+        )
+        app.teardown_appcontext(self.teardown)
+
+    @property
+    def connection(self):
+        if not has_app_context():
+            return None
+        conn = g.get("_pooled_mysql")
+        if conn is None:
+            conn = self.pool.acquire()
+            g._pooled_mysql = conn
+        return conn
+
+    def teardown(self, exception):
+        conn = g.pop("_pooled_mysql", None)
+        if conn is not None:
+            self.pool.release(conn)
@@ -0,0 +1,150 @@
+import itertools
+import json
+import queue
+import threading
+import time
+from collections import defaultdict, deque
+
+
+class StreamLimitReached(Exception):
+    """Raised when opening another stream would exceed the hub's ``max_streams``."""
+
+
+class EventHub:
+    """Fan-out of server-sent events to every open stream of a user.
+
+    Each published event gets a process-wide increasing id and is kept in a
+    short per-user replay buffer, so a browser reconnecting with
+    ``Last-Event-ID`` receives what it missed instead of re-polling.
+
+    Every open stream pins a server thread under a threaded worker, so at most
+    ``max_streams`` are open at once (0 for no limit); beyond that
+    ``subscribe`` raises StreamLimitReached and clients fall back to polling.
+    """
+
+    def __init__(self, replay_size=200, subscriber_queue_size=256, heartbeat_seconds=15, max_streams=0):
+        self.max_streams = max_streams
+        self.replay_size = replay_size
+        self.subscriber_queue_size = subscriber_queue_size
+        self.heartbeat_seconds = heartbeat_seconds
+
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+        self._history = defaultdict(lambda: deque(maxlen=self.replay_size))
+
+        self._open = 0
+        self.published = 0
+        self.dropped = 0
+        self.rejected = 0
+
+    def publish(self, user_id, event, data):
+        """Queue ``event`` with JSON-serializable ``data`` for all streams of ``user_id``."""
+        if not user_id:
+            return
+        payload = json.dumps(data, default=str)
+        with self._lock:
+            entry = (next(self._ids), event, payload)
+            self._history[user_id].append(entry)
+            subscribers = list(self._subscribers.get(user_id, ()))
+            self.published += 1
+
+        for q in subscribers:
+            try:
+                q.put_nowait(entry)
+            except queue.Full:
+                # A stalled client loses live events; it catches up via replay on reconnect
+                self.dropped += 1
+
+    def subscribe(self, user_id, last_event_id=None):
+        """Register a stream and return (queue, backlog) for events after ``last_event_id``."""
+        q = queue.Queue(maxsize=self.subscriber_queue_size)
+        with self._lock:
+            if self.max_streams and self._open >= self.max_streams:
+                self.rejected += 1
+                raise StreamLimitReached(f"{self._open} event streams already open")
+            self._open += 1
+            self._subscribers[user_id].add(q)
+            history = list(self._history.get(user_id, ()))
+
+        backlog = []
+        if last_event_id is not None:
+            backlog = [entry for entry in history if entry[0] > last_event_id]
+            # Buffer no longer reaches back far enough: tell the client to refetch
+            if history and history[0][0] > last_event_id + 1:
+                backlog.insert(0, (history[-1][0], "resync", "{}"))
+        return q, backlog
+
+    def unsubscribe(self, user_id, q):
+        """Drop a stream's queue (idempotent)."""
+        with self._lock:
+            subscribers = self._subscribers.get(user_id)
+            if subscribers and q in subscribers:
+                subscribers.discard(q)
+                self._open -= 1
+                if not subscribers:
+                    del self._subscribers[user_id]
+
+    @staticmethod
+    def format(entry):
+        event_id, event, payload = entry
+        return f"id: {event_id}\nevent: {event}\ndata: {payload}\n\n"
+
+    def stream(self, user_id, q, backlog):
+        """Generator of SSE frames for a queue and backlog from ``subscribe``.
+
+        The caller also unsubscribes when the response closes, since a generator
+        that never starts never runs its ``finally``.
+        """
+        try:
+            yield "retry: 3000\n\n"
+            for entry in backlog:
+                yield self.format(entry)
+            while True:
+                try:
+                    entry = q.get(timeout=self.heartbeat_seconds)
+                except queue.Empty:
+                    # Comment line keeps proxies from closing an idle connection
+                    yield ": heartbeat\n\n"
+                    continue
+                yield self.format(entry)
+        finally:
+            self.unsubscribe(user_id, q)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "users_connected": len(self._subscribers),
+                "streams": self._open,
+                "max_streams": self.max_streams,
+                "rejected": self.rejected,
+                "published": self.published,
+                "dropped": self.dropped,
+            }
+
+
+class UserVersions:
+    """Per-user change counters that back ETags for the polled JSON endpoints.
+
+    Write paths bump a (user, kind) counter; readers compare the client's
+    If-None-Match against the current tag before touching the database. The
+    process epoch in the tag keeps a restarted server from matching tags it
+    handed out before the counters reset.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versions = {}
+        self._epoch = format(int(time.time() * 1000), "x")
+
+    def bump(self, user_id, kind):
+        if not user_id:
+            return
+        with self._lock:
+            key = (user_id, kind)
+            self._versions[key] = self._versions.get(key, 0) + 1
+
+    def etag(self, user_id, kind):
+        with self._lock:
+            version = self._versions.get((user_id, kind), 0)
+        return f"{kind}-{user_id}-{self._epoch}-{version}"
@@ -0,0 +1,124 @@
+import queue
+import threading
+import time
+
+
+class IngestPipeline:
+    """Bounded hand-off between the PubNub callback thread and a batch writer.
+
+    The callback only enqueues readings. A single writer thread drains the
+    queue in micro-batches and passes each batch to ``handler``, so database
+    round trips are paid once per batch instead of once per reading.
+    """
+
+    def __init__(self, handler, max_queue=10000, max_batch=500, max_linger=0.25):
+        self.handler = handler
+        self.max_queue = max_queue
+        self.max_batch = max_batch
+        self.max_linger = max_linger
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+        self.received = 0
+        self.dropped = 0
+        self.batches = 0
+        self.written = 0
+        self.failed_batches = 0
+        self.high_water = 0
+        self.last_batch_size = 0
+        self.last_flush_ms = 0.0
+
+    def start(self):
+        """Start the writer thread (idempotent)."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="moisture-ingest", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        """Ask the writer to flush what is queued and exit."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def submit(self, reading):
+        """Enqueue a reading without blocking. Returns False if it was dropped."""
+        try:
+            self._queue.put_nowait(reading)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+
+        with self._lock:
+            self.received += 1
+            depth = self._queue.qsize()
+            if depth > self.high_water:
+                self.high_water = depth
+        return True
+
+    def _next_batch(self):
+        """Block for the first reading, then collect more until the batch is full or the linger expires."""
+        try:
+            batch = [self._queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+
+        deadline = time.monotonic() + self.max_linger
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not (self._stop.is_set() and self._queue.empty()):
+            batch = self._next_batch()
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            try:
+                self.handler(batch)
+                ok = True
+            except Exception as e:
+                print(f"Error writing moisture batch of {len(batch)}: {e}")
+                ok = False
+            elapsed_ms = (time.perf_counter() - started) * 1000
+
+            with self._lock:
+                self.batches += 1
+                self.last_batch_size = len(batch)
+                self.last_flush_ms = round(elapsed_ms, 2)
+                if ok:
+                    self.written += len(batch)
+                else:
+                    self.failed_batches += 1
+
+    def stats(self):
+        """Counters for monitoring backpressure and loss."""
+        with self._lock:
+            depth = self._queue.qsize()
+            return {
+                "queue_depth": depth,
+                "queue_capacity": self.max_queue,
+                "queue_utilization": round(depth / self.max_queue, 3) if self.max_queue else 0,
+                "high_water": self.high_water,
+                "received": self.received,
+                "dropped": self.dropped,
+                "written": self.written,
+                "batches": self.batches,
+                "failed_batches": self.failed_batches,
+                "last_batch_size": self.last_batch_size,
+                "last_flush_ms": self.last_flush_ms,
+                "writer_alive": bool(self._thread and self._thread.is_alive()),
+            }
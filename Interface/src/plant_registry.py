@@ -0,0 +1,76 @@
+import threading
+
+
+class PlantRegistry:
+    """Process-wide hardware_id -> plant lookup for the ingest hot path.
+
+    The table is loaded once and kept in memory. Routes that change plants
+    call ``invalidate()``; the next lookup reloads the whole mapping with a
+    single query, so readings never trigger per-message lookups.
+    """
+
+    def __init__(self, loader):
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._by_hardware = {}
+        self._by_id = {}
+        self._generation = 0
+        self._loaded_generation = -1
+        self.loads = 0
+
+    def load(self):
+        """Reload every plant from the database via the loader callable."""
+        with self._lock:
+            generation = self._generation
+            rows = self._loader()
+
+            by_hardware = {}
+            by_id = {}
+            for row in rows:
+                plant = {
+                    "id": row['id'],
+                    "name": row['name'],
+                    "moisture_threshold": row['moisture_threshold'],
+                    "user_id": row['user_id'],
+                    "hardware_id": row['hardware_id'],
+                    "watering_duration": row.get('watering_duration') or 10,
+                }
+                by_id[plant["id"]] = plant
+                if plant["hardware_id"]:
+                    by_hardware[plant["hardware_id"]] = plant
+
+            self._by_hardware = by_hardware
+            self._by_id = by_id
+            self._loaded_generation = generation
+            self.loads += 1
+
+    def invalidate(self):
+        """Mark the mapping stale after a plant write; it reloads on next use."""
+        with self._lock:
+            self._generation += 1
+
+    @property
+    def is_stale(self):
+        return self._loaded_generation != self._generation
+
+    def _ensure_loaded(self):
+        if self.is_stale:
+            self.load()
+
+    def get(self, hardware_id):
+        """Plant dict for a hardware_id, or None if no plant is bound to it."""
+        self._ensure_loaded()
+        return self._by_hardware.get(hardware_id)
+
+    def get_by_id(self, plant_id):
+        """Plant dict for a plant id, or None."""
+        self._ensure_loaded()
+        return self._by_id.get(plant_id)
+
+    def stats(self):
+        return {
+            "plants": len(self._by_id),
+            "hardware_ids": len(self._by_hardware),
+            "loads": self.loads,
+            "stale": self.is_stale,
+        }
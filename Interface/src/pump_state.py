@@ -0,0 +1,107 @@
+import threading
+import time
+
+IDLE = "IDLE"
+WATERING = "WATERING"
+COOLDOWN = "COOLDOWN"
+
+
+class PumpStateMachine:
+    """Per-plant pump state kept in memory: IDLE -> WATERING -> COOLDOWN -> IDLE.
+
+    Auto-watering decisions read this instead of querying the newest pump row
+    in moisture_readings. COOLDOWN gives the soil time to absorb water before
+    another below-threshold reading can start the pump again.
+    """
+
+    def __init__(self, cooldown_seconds=60, on_change=None):
+        self.cooldown_seconds = cooldown_seconds
+        self.on_change = on_change
+        self._lock = threading.Lock()
+        self._plants = {}
+
+    def _notify(self, plant_id, state):
+        if self.on_change:
+            try:
+                self.on_change(plant_id, state)
+            except Exception as e:
+                print(f"Pump state listener failed for plant {plant_id}: {e}")
+
+    def _resolve(self, plant_id, now):
+        entry = self._plants.get(plant_id)
+        if not entry:
+            return IDLE
+        if entry["state"] == COOLDOWN and now >= entry["until"]:
+            entry["state"] = IDLE
+            entry["until"] = None
+        return entry["state"]
+
+    def state(self, plant_id):
+        with self._lock:
+            return self._resolve(plant_id, time.time())
+
+    def begin_watering(self, plant_id, automatic=False):
+        """Move a plant to WATERING.
+
+        Automatic requests only succeed from IDLE so a running or cooling pump
+        is never re-triggered. Manual requests always win. Returns True if the
+        caller should send PUMP_ON.
+        """
+        now = time.time()
+        with self._lock:
+            current = self._resolve(plant_id, now)
+            if automatic and current != IDLE:
+                return False
+            self._plants[plant_id] = {
+                "state": WATERING,
+                "since": now,
+                "until": None,
+                "automatic": automatic,
+            }
+        self._notify(plant_id, WATERING)
+        return True
+
+    def finish_watering(self, plant_id):
+        """Pump was switched off; start the cooldown window."""
+        now = time.time()
+        with self._lock:
+            self._plants[plant_id] = {
+                "state": COOLDOWN,
+                "since": now,
+                "until": now + self.cooldown_seconds,
+                "automatic": False,
+            }
+        self._notify(plant_id, COOLDOWN)
+
+    def reset(self, plant_id):
+        """Drop back to IDLE, e.g. when a PUMP_ON command could not be sent."""
+        with self._lock:
+            self._plants.pop(plant_id, None)
+        self._notify(plant_id, IDLE)
+
+    def restore(self, plant_id, pump_on, recorded_at):
+        """Rebuild state from the newest pump row (recorded_at as a POSIX timestamp)."""
+        with self._lock:
+            if pump_on:
+                self._plants[plant_id] = {
+                    "state": WATERING,
+                    "since": recorded_at,
+                    "until": None,
+                    "automatic": False,
+                }
+            elif recorded_at + self.cooldown_seconds > time.time():
+                self._plants[plant_id] = {
+                    "state": COOLDOWN,
+                    "since": recorded_at,
+                    "until": recorded_at + self.cooldown_seconds,
+                    "automatic": False,
+                }
+            else:
+                self._plants.pop(plant_id, None)
+
+    def snapshot(self):
+        """Current state of every non-idle plant."""
+        now = time.time()
+        with self._lock:
+            states = {plant_id: self._resolve(plant_id, now) for plant_id in list(self._plants)}
+        return {plant_id: state for plant_id, state in states.items() if state != IDLE}
@@ -0,0 +1,287 @@
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+# (level, bucket seconds, table), finest first
+ROLLUP_LEVELS = (
+    ("minute", 60, "moisture_rollup_minute"),
+    ("hour", 3600, "moisture_rollup_hour"),
+    ("day", 86400, "moisture_rollup_day"),
+)
+
+
+def bucket_sql(column, seconds):
+    """SQL expression flooring ``column`` to a minute, hour or day bucket (session time zone)"""
+    if seconds == 60:
+        return f"({column} - INTERVAL SECOND({column}) SECOND)"
+    if seconds == 3600:
+        return f"({column} - INTERVAL (MINUTE({column}) * 60 + SECOND({column})) SECOND)"
+    return f"TIMESTAMP(DATE({column}))"
+
+
+def floor_time(ts, seconds):
+    """Python counterpart of ``bucket_sql`` for naive datetimes"""
+    if seconds == 60:
+        return ts.replace(second=0, microsecond=0)
+    if seconds == 3600:
+        return ts.replace(minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+class RetentionEngine:
+    """Rolls raw moisture_readings up into minute/hour/day tables and trims old rows.
+
+    Each run recomputes buckets from a persisted watermark (minus
+    ``late_seconds`` so late-arriving readings are folded in), walking forward
+    in spans of at most ``max_span_hours`` so no single statement scans an
+    unbounded range. Readings older than that, such as a bridge spool replayed
+    after an outage, are flagged by ingest with ``mark_late``; the next run
+    moves the watermark back to the oldest of them before rolling. Raw rows
+    older than ``raw_days`` and rollups past their own retention are then
+    deleted in ``chunk_size`` batches, each committed separately. Raw rows are
+    never deleted before they have been rolled up.
+    """
+
+    def __init__(self, pool, raw_days=7, minute_days=30, hour_days=365, day_days=0,
+                 interval_seconds=300, chunk_size=5000, late_seconds=3600,
+                 max_span_hours=6, max_pump_on_seconds=3600):
+        self._pool = pool
+        self.raw_days = raw_days
+        self.retention_days = {"minute": minute_days, "hour": hour_days, "day": day_days}
+        self.interval_seconds = interval_seconds
+        self.chunk_size = chunk_size
+        self.late = timedelta(seconds=late_seconds)
+        self.max_span = timedelta(hours=max_span_hours)
+        # A pump ON row with no following OFF row counts as on for at most this long
+        self.max_pump_on = timedelta(seconds=max_pump_on_seconds)
+
+        self.watermark = None
+        self.runs = 0
+        self.failed_runs = 0
+        self.spans_rolled = 0
+        self.deleted = defaultdict(int)
+        self.last_run_ms = 0.0
+        self.last_error = None
+
+    def schedule(self, scheduler, delay=None):
+        """Run on ``scheduler`` every ``interval_seconds``."""
+        scheduler.schedule("retention", self.interval_seconds if delay is None else delay,
+                           self._run_scheduled, scheduler)
+
+    def _run_scheduled(self, scheduler):
+        try:
+            self.run_once()
+        finally:
+            self.schedule(scheduler)
+
+    def run_once(self):
+        started = time.perf_counter()
+        conn = self._pool.acquire()
+        discard = False
+        try:
+            cur = conn.cursor()
+            try:
+                self._roll_up(conn, cur)
+                self._trim(conn, cur)
+            finally:
+                cur.close()
+            self.runs += 1
+            self.last_error = None
+        except Exception as e:
+            discard = True
+            self.failed_runs += 1
+            self.last_error = str(e)
+            raise
+        finally:
+            self._pool.release(conn, discard=discard)
+            self.last_run_ms = round((time.perf_counter() - started) * 1000, 3)
+
+    @staticmethod
+    def mark_late(cur, oldest):
+        """Record readings stored behind the re-roll window (caller commits with the readings).
+
+        Keeps the oldest such ``recorded_at`` in retention_state under 'late'.
+        """
+        cur.execute("""
+                    INSERT INTO retention_state (name, rolled_until) VALUES ('late', %s)
+                    ON DUPLICATE KEY UPDATE rolled_until = LEAST(rolled_until, VALUES(rolled_until))
+                    """, (oldest,))
+
+    def _claim_late(self, conn, cur):
+        """Move the watermark back to the oldest late reading and clear the mark in one transaction.
+
+        Marks written after this commit start a new row for the following run;
+        a run that fails midway resumes from the lowered watermark.
+        """
+        cur.execute("SELECT rolled_until FROM retention_state WHERE name = 'late' FOR UPDATE")
+        row = cur.fetchone()
+        if not row:
+            conn.commit()
+            return
+        cur.execute("""
+                    UPDATE retention_state SET rolled_until = LEAST(rolled_until, %s)
+                    WHERE name = 'rollup'
+                    """, (floor_time(row["rolled_until"], 60) + self.late,))
+        cur.execute("DELETE FROM retention_state WHERE name = 'late'")
+        conn.commit()
+
+    def _roll_up(self, conn, cur):
+        cur.execute("SELECT NOW() AS now")
+        now = floor_time(cur.fetchone()["now"], 60)
+
+        self._claim_late(conn, cur)
+        cur.execute("SELECT rolled_until FROM retention_state WHERE name = 'rollup'")
+        row = cur.fetchone()
+        if row:
+            start = row["rolled_until"] - self.late
+        else:
+            cur.execute("SELECT MIN(recorded_at) AS first FROM moisture_readings")
+            first = cur.fetchone()["first"]
+            if first is None:
+                return
+            start = floor_time(first, 60)
+
+        while start < now:
+            end = min(start + self.max_span, now)
+            self._roll_minutes(cur, start, end)
+            self._roll_pump_seconds(cur, start, end)
+            self._roll_level(cur, ROLLUP_LEVELS[0], ROLLUP_LEVELS[1], start, end)
+            self._roll_level(cur, ROLLUP_LEVELS[1], ROLLUP_LEVELS[2], start, end)
+            cur.execute("""
+                        INSERT INTO retention_state (name, rolled_until) VALUES ('rollup', %s)
+                        ON DUPLICATE KEY UPDATE rolled_until = VALUES(rolled_until)
+                        """, (end,))
+            conn.commit()
+            self.watermark = end
+            self.spans_rolled += 1
+            start = end
+
+    def _roll_minutes(self, cur, start, end):
+        bucket = bucket_sql("recorded_at", 60)
+        cur.execute(f"""
+                    INSERT INTO moisture_rollup_minute
+                        (plant_id, bucket_start, min_level, max_level, avg_level, sample_count)
+                    SELECT plant_id, {bucket} AS bucket, MIN(moisture_level), MAX(moisture_level),
+                           AVG(moisture_level), COUNT(*)
+                    FROM moisture_readings
+                    WHERE recorded_at >= %s AND recorded_at < %s AND moisture_level IS NOT NULL
+                    GROUP BY plant_id, bucket
+                    ON DUPLICATE KEY UPDATE min_level = VALUES(min_level),
+                                            max_level = VALUES(max_level),
+                                            avg_level = VALUES(avg_level),
+                                            sample_count = VALUES(sample_count)
+                    """, (start, end))
+
+    def _roll_pump_seconds(self, cur, start, end):
+        """Seconds the pump was on per minute bucket, from consecutive pump rows via LEAD()."""
+        cur.execute("""
+                    SELECT plant_id, pump_status, recorded_at,
+                           LEAD(recorded_at) OVER (PARTITION BY plant_id ORDER BY recorded_at, id) AS next_at
+                    FROM moisture_readings
+                    WHERE moisture_level IS NULL AND recorded_at >= %s AND recorded_at < %s
+                    """, (start - self.max_pump_on, end))
+
+        seconds = defaultdict(float)
+        for row in cur.fetchall():
+            if not row["pump_status"]:
+                continue
+            on_at = max(row["recorded_at"], start)
+            off_at = min(row["next_at"] or row["recorded_at"] + self.max_pump_on,
+                         row["recorded_at"] + self.max_pump_on, end)
+            while on_at < off_at:
+                bucket = floor_time(on_at, 60)
+                step_end = min(bucket + timedelta(minutes=1), off_at)
+                seconds[(row["plant_id"], bucket)] += (step_end - on_at).total_seconds()
+                on_at = step_end
+
+        cur.execute("""
+                    UPDATE moisture_rollup_minute SET pump_on_seconds = 0
+                    WHERE bucket_start >= %s AND bucket_start < %s AND pump_on_seconds > 0
+                    """, (start, end))
+        if seconds:
+            cur.executemany("""
+                            INSERT INTO moisture_rollup_minute (plant_id, bucket_start, pump_on_seconds)
+                            VALUES (%s, %s, %s)
+                            ON DUPLICATE KEY UPDATE pump_on_seconds = VALUES(pump_on_seconds)
+                            """, [(plant_id, bucket, round(value, 2))
+                                  for (plant_id, bucket), value in seconds.items()])
+
+    def _roll_level(self, cur, source, target, start, end):
+        """Recompute ``target`` buckets touching [start, end) from the finer ``source`` table."""
+        _, _, source_table = source
+        _, seconds, target_table = target
+        bucket = bucket_sql("bucket_start", seconds)
+        cur.execute(f"""
+                    INSERT INTO {target_table}
+                        (plant_id, bucket_start, min_level, max_level, avg_level, sample_count, pump_on_seconds)
+                    SELECT plant_id, {bucket} AS bucket, MIN(min_level), MAX(max_level),
+                           SUM(avg_level * sample_count) / NULLIF(SUM(sample_count), 0),
+                           SUM(sample_count), SUM(pump_on_seconds)
+                    FROM {source_table}
+                    WHERE bucket_start >= %s AND bucket_start < %s
+                    GROUP BY plant_id, bucket
+                    ON DUPLICATE KEY UPDATE min_level = VALUES(min_level),
+                                            max_level = VALUES(max_level),
+                                            avg_level = VALUES(avg_level),
+                                            sample_count = VALUES(sample_count),
+                                            pump_on_seconds = VALUES(pump_on_seconds)
+                    """, (floor_time(start, seconds), end))
+
+    def _trim(self, conn, cur):
+        if self.watermark is None:
+            return
+        cur.execute("SELECT NOW() AS now")
+        now = cur.fetchone()["now"]
+
+        # Keep anything the next run may still re-roll, plus the pump lookback
+        raw_cutoff = min(now - timedelta(days=self.raw_days),
+                         self.watermark - self.late - self.max_pump_on)
+        # Late readings stored since this run's rollup are kept for the next one
+        cur.execute("SELECT rolled_until FROM retention_state WHERE name = 'late'")
+        late = cur.fetchone()
+        if late:
+            raw_cutoff = min(raw_cutoff, late["rolled_until"] - self.max_pump_on)
+        self._delete_chunked(conn, cur, "moisture_readings", "recorded_at", raw_cutoff)
+
+        for level, _, table in ROLLUP_LEVELS:
+            days = self.retention_days[level]
+            if days:
+                self._delete_chunked(conn, cur, table, "bucket_start", now - timedelta(days=days))
+
+    def _delete_chunked(self, conn, cur, table, column, cutoff):
+        while True:
+            cur.execute(f"DELETE FROM {table} WHERE {column} < %s LIMIT %s", (cutoff, self.chunk_size))
+            conn.commit()
+            self.deleted[table] += cur.rowcount
+            if cur.rowcount < self.chunk_size:
+                return
+
+    def source_for(self, start, now, bucket_seconds):
+        """Table to read for buckets of ``bucket_seconds`` starting at ``start``.
+
+        Raw rows are only used for sub-minute buckets they still cover. Otherwise
+        this is the coarsest rollup no wider than a bucket that still covers
+        ``start``, falling back to the finest covering rollup.
+        """
+        if bucket_seconds < 60 and start >= now - timedelta(days=self.raw_days):
+            return "moisture_readings"
+        covering = [(seconds, table) for level, seconds, table in ROLLUP_LEVELS
+                    if not self.retention_days[level]
+                    or start >= now - timedelta(days=self.retention_days[level])]
+        if not covering:
+            return ROLLUP_LEVELS[-1][2]
+        fitting = [table for seconds, table in covering if seconds <= max(bucket_seconds, 60)]
+        return fitting[-1] if fitting else covering[0][1]
+
+    def stats(self):
+        return {
+            "runs": self.runs,
+            "failed_runs": self.failed_runs,
+            "spans_rolled": self.spans_rolled,
+            "watermark": self.watermark.isoformat() if self.watermark else None,
+            "deleted": dict(self.deleted),
+            "last_run_ms": self.last_run_ms,
+            "last_error": self.last_error,
+            "raw_days": self.raw_days,
+            "retention_days": self.retention_days,
+        }
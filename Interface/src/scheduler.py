@@ -0,0 +1,137 @@
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class DeadlineScheduler:
+    """Runs keyed callbacks at deadlines from a single thread backed by a heap.
+
+    Each key (a plant id for pump-off work) has at most one pending deadline.
+    Scheduling an existing key replaces it; superseded heap entries are skipped
+    when they surface, so cancel and extend are O(log n) and the thread count
+    stays at one no matter how many plants are watering.
+
+    With ``workers`` set, the heap thread only keeps time: due callbacks run
+    on a pool of that many threads, so one slow callback (a blocking publish
+    or a pool wait) can't hold back other keys that fall due. With
+    ``workers=0`` callbacks run on the heap thread itself, in deadline order.
+    """
+
+    def __init__(self, name="deadline-scheduler", workers=0):
+        self.name = name
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{name}-worker") \
+            if workers else None
+        self._stats_lock = threading.Lock()
+        self._heap = []
+        self._jobs = {}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+        self.executed = 0
+        self.failed = 0
+
+    def start(self):
+        """Start the worker thread (idempotent)."""
+        with self._cond:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread:
+            self._thread.join(5)
+        if self._executor:
+            self._executor.shutdown(wait=False)
+
+    def _push(self, key, due, fn, args):
+        seq = next(self._seq)
+        self._jobs[key] = (due, seq, fn, args)
+        heapq.heappush(self._heap, (due, seq, key))
+        self._cond.notify()
+
+    def schedule(self, key, delay, fn, *args):
+        """Run ``fn(*args)`` after ``delay`` seconds, replacing any pending job for ``key``."""
+        self.start()
+        with self._cond:
+            self._push(key, time.monotonic() + delay, fn, args)
+
+    def cancel(self, key):
+        """Drop the pending job for ``key``. Returns True if one existed."""
+        with self._cond:
+            return self._jobs.pop(key, None) is not None
+
+    def extend(self, key, delay):
+        """Push the pending deadline for ``key`` to at least ``delay`` seconds from now.
+
+        Returns False if nothing is pending for ``key``.
+        """
+        with self._cond:
+            job = self._jobs.get(key)
+            if not job:
+                return False
+            due, _, fn, args = job
+            new_due = time.monotonic() + delay
+            if new_due > due:
+                self._push(key, new_due, fn, args)
+            return True
+
+    def remaining(self, key):
+        """Seconds until ``key`` fires, or None if nothing is pending."""
+        with self._cond:
+            job = self._jobs.get(key)
+            return max(0.0, job[0] - time.monotonic()) if job else None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._stopping:
+                        return
+                    # Discard heap entries superseded by cancel/extend/reschedule
+                    while self._heap and self._jobs.get(self._heap[0][2], (None, None))[1] != self._heap[0][1]:
+                        heapq.heappop(self._heap)
+                    if not self._heap:
+                        self._cond.wait()
+                        continue
+                    due, seq, key = self._heap[0]
+                    wait = due - time.monotonic()
+                    if wait <= 0:
+                        heapq.heappop(self._heap)
+                        _, _, fn, args = self._jobs.pop(key)
+                        break
+                    self._cond.wait(wait)
+
+            if self._executor:
+                self._executor.submit(self._execute, key, fn, args)
+            else:
+                self._execute(key, fn, args)
+
+    def _execute(self, key, fn, args):
+        try:
+            fn(*args)
+            with self._stats_lock:
+                self.executed += 1
+        except Exception as e:
+            with self._stats_lock:
+                self.failed += 1
+            print(f"Scheduled job {key!r} failed: {e}")
+
+    def stats(self):
+        with self._cond:
+            return {
+                "pending": len(self._jobs),
+                "workers": self.workers,
+                "heap_size": len(self._heap),
+                "executed": self.executed,
+                "failed": self.failed,
+                "thread_alive": bool(self._thread and self._thread.is_alive()),
+            }
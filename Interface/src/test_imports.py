@@ -1,40 +1,88 @@
+"""Import-time regression check for the web app.
+
+Imports ``Interface.src.app`` in a fresh interpreter under ``-X importtime``
+and fails when the import takes longer than IMPORT_BUDGET_MS, loads a module
+that should only load on first use, or starts a background thread. Run from
+anywhere:
+
+    python Interface/src/test_imports.py
+"""
+import json
 import os
+import subprocess
 import sys
 
-print(f"Python executable: {sys.executable}")
-print(f"Python version: {sys.version}")
-print(f"Current directory: {os.getcwd()}")
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+IMPORT_BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", 1500))
+
+# Loaded on first use (AI advice, Google sign-in, PubNub client), never at import
+LAZY_MODULES = ("google.generativeai", "authlib.integrations.flask_client", "pubnub.pubnub")
+
+PROBE = f"""
+import json, sys, threading, time
+started = time.perf_counter()
+import Interface.src.app
+elapsed_ms = (time.perf_counter() - started) * 1000
+print(json.dumps({{
+    "elapsed_ms": elapsed_ms,
+    "loaded": [name for name in {LAZY_MODULES!r} if name in sys.modules],
+    "threads": [t.name for t in threading.enumerate() if t is not threading.main_thread()],
+}}))
+"""
+
+
+def slowest_imports(importtime_log, top=10):
+    """(cumulative_ms, module) pairs parsed from ``-X importtime`` output."""
+    rows = []
+    for line in importtime_log.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, module = line.split("|", 2)
+        try:
+            rows.append((int(cumulative.strip()) / 1000, module.strip()))
+        except ValueError:
+            continue  # header row
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    print(f"Python executable: {sys.executable}")
+    print(f"Python version: {sys.version}")
 
-# Test authlib import
-try:
-    import authlib
-    print(f"✓ Authlib version: {authlib.__version__}")
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [REPO_ROOT, os.getenv("PYTHONPATH")])))
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", PROBE],
+                          cwd=REPO_ROOT, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        print("✗ Importing Interface.src.app failed:")
+        print("\n".join(line for line in proc.stderr.splitlines() if not line.startswith("import time:")))
+        return 1
 
-    # Check what's in integrations
-    import authlib.integrations
-    print("✓ authlib.integrations imported")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    print(f"Import time: {result['elapsed_ms']:.0f} ms (budget {IMPORT_BUDGET_MS:.0f} ms)")
+    print("Slowest imports (cumulative):")
+    for ms, module in slowest_imports(proc.stderr):
+        print(f"  {ms:8.1f} ms  {module}")
 
-    # List available modules
-    import pkgutil
-    path = authlib.integrations.__path__
-    print(f"Integration modules available:")
-    for finder, name, ispkg in pkgutil.iter_modules(path):
-        print(f"  - {name}")
+    failures = []
+    if result["elapsed_ms"] > IMPORT_BUDGET_MS:
+        failures.append(f"import took {result['elapsed_ms']:.0f} ms, over the {IMPORT_BUDGET_MS:.0f} ms budget")
+    for name in result["loaded"]:
+        failures.append(f"{name} was imported eagerly; it should load on first use")
+    for name in result["threads"]:
+        failures.append(f"thread {name!r} started at import; start services via create_app()")
 
-    # Try specific import
     try:
-        from authlib.integrations.flask_client import OAuth
-        print("✓ SUCCESS: from authlib.integrations.flask_client import OAuth")
+        import authlib.integrations.flask_client  # noqa: F401
+        print("✓ authlib flask_client available (Google sign-in)")
     except ImportError as e:
-        print(f"✗ FAILED flask_client import: {e}")
+        print(f"⚠ authlib flask_client unavailable, Google sign-in disabled: {e}")
 
-        # Try different import style
-        try:
-            import authlib.integrations.flask_client as fc
-            print(f"✓ SUCCESS with import authlib.integrations.flask_client")
-            print(f"  Available in module: {dir(fc)}")
-        except ImportError as e2:
-            print(f"✗ Also failed: {e2}")
-
-except ImportError as e:
-    print(f"✗ Failed to import authlib at all: {e}")
\ No newline at end of file
+    for failure in failures:
+        print(f"✗ {failure}")
+    if not failures:
+        print("✓ Import-time checks passed")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,56 @@
+import threading
+import time
+
+
+class UnreadCounter:
+    """Per-user unread notification counts kept in memory.
+
+    Counts are loaded from the database on first use and then adjusted by the
+    write paths using driver row counts. Each entry is reconciled with a fresh
+    COUNT(*) once it is older than ``reconcile_seconds``, which bounds any
+    drift from writes that bypass the counter.
+    """
+
+    def __init__(self, loader, reconcile_seconds=300):
+        self._loader = loader
+        self.reconcile_seconds = reconcile_seconds
+        self._lock = threading.Lock()
+        self._counts = {}
+        self.hits = 0
+        self.loads = 0
+
+    def get(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._counts.get(user_id)
+            if entry and now - entry[1] < self.reconcile_seconds:
+                self.hits += 1
+                return entry[0]
+
+        count = self._loader(user_id)
+        with self._lock:
+            self._counts[user_id] = (count, now)
+            self.loads += 1
+        return count
+
+    def adjust(self, user_id, delta):
+        """Apply a known change; users without a cached count are left to load lazily."""
+        if not delta:
+            return
+        with self._lock:
+            entry = self._counts.get(user_id)
+            if entry:
+                self._counts[user_id] = (max(0, entry[0] + delta), entry[1])
+
+    def set(self, user_id, count):
+        with self._lock:
+            self._counts[user_id] = (count, time.monotonic())
+
+    def invalidate(self, user_id):
+        """Forget a user's count so the next read reconciles with the database."""
+        with self._lock:
+            self._counts.pop(user_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {"users_cached": len(self._counts), "hits": self.hits, "loads": self.loads}
@@ -39,6 +39,74 @@ CREATE TABLE IF NOT EXISTS moisture_readings (
     pump_status BOOLEAN DEFAULT FALSE,
     is_automated BOOLEAN DEFAULT FALSE,
     recorded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (plant_id) REFERENCES plants(id) ON DELETE CASCADE,
+    INDEX idx_readings_plant_time (plant_id, recorded_at),
+    INDEX idx_readings_time (recorded_at)
+);
+
+-- Minute/hour/day rollups written by the retention job
+CREATE TABLE IF NOT EXISTS moisture_rollup_minute (
+    plant_id INT NOT NULL,
+    bucket_start DATETIME NOT NULL,
+    min_level DECIMAL(5,2) NULL,
+    max_level DECIMAL(5,2) NULL,
+    avg_level DECIMAL(7,3) NULL,
+    sample_count INT NOT NULL DEFAULT 0,
+    pump_on_seconds DECIMAL(9,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (plant_id, bucket_start),
+    INDEX idx_rollup_minute_time (bucket_start),
+    FOREIGN KEY (plant_id) REFERENCES plants(id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS moisture_rollup_hour (
+    plant_id INT NOT NULL,
+    bucket_start DATETIME NOT NULL,
+    min_level DECIMAL(5,2) NULL,
+    max_level DECIMAL(5,2) NULL,
+    avg_level DECIMAL(7,3) NULL,
+    sample_count INT NOT NULL DEFAULT 0,
+    pump_on_seconds DECIMAL(11,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (plant_id, bucket_start),
+    INDEX idx_rollup_hour_time (bucket_start),
+    FOREIGN KEY (plant_id) REFERENCES plants(id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS moisture_rollup_day (
+    plant_id INT NOT NULL,
+    bucket_start DATETIME NOT NULL,
+    min_level DECIMAL(5,2) NULL,
+    max_level DECIMAL(5,2) NULL,
+    avg_level DECIMAL(7,3) NULL,
+    sample_count INT NOT NULL DEFAULT 0,
+    pump_on_seconds DECIMAL(11,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (plant_id, bucket_start),
+    INDEX idx_rollup_day_time (bucket_start),
+    FOREIGN KEY (plant_id) REFERENCES plants(id) ON DELETE CASCADE
+);
+
+-- Rollup watermark for the retention job
+CREATE TABLE IF NOT EXISTS retention_state (
+    name VARCHAR(32) PRIMARY KEY,
+    rolled_until DATETIME NOT NULL
+);
+
+-- AI care advice cache, keyed by plant inputs and moisture band
+CREATE TABLE IF NOT EXISTS ai_advice_cache (
+    cache_key CHAR(64) PRIMARY KEY,
+    plant_id INT NULL,
+    advice TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_advice_created (created_at),
+    FOREIGN KEY (plant_id) REFERENCES plants(id) ON DELETE CASCADE
+);
+
+-- Latest reading and pump state per plant (kept current by the ingest writer)
+CREATE TABLE IF NOT EXISTS plant_latest (
+    plant_id INT PRIMARY KEY,
+    moisture_level DECIMAL(5,2),
+    recorded_at TIMESTAMP NULL,
+    pump_status BOOLEAN DEFAULT FALSE,
+    pump_changed_at TIMESTAMP NULL,
     FOREIGN KEY (plant_id) REFERENCES plants(id) ON DELETE CASCADE
 );
 
@@ -49,11 +117,16 @@ CREATE TABLE IF NOT EXISTS user_notifications (
     plant_id INT,
     title VARCHAR(255) NOT NULL,
     message TEXT NOT NULL,
-    event_type ENUM('low_moisture', 'auto_watering', 'manual_watering', 'threshold_update', 'system') DEFAULT 'system',
+    event_type ENUM('low_moisture', 'critical_moisture', 'auto_watering', 'watering_complete',
+                    'manual_watering', 'manual_stop', 'threshold_update', 'system') DEFAULT 'system',
     is_read BOOLEAN DEFAULT FALSE,
+    occurrences INT NOT NULL DEFAULT 1, -- Repeats coalesced into this alert
+    last_seen_at TIMESTAMP NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
-    FOREIGN KEY (plant_id) REFERENCES plants(id) ON DELETE SET NULL
+    FOREIGN KEY (plant_id) REFERENCES plants(id) ON DELETE SET NULL,
+    INDEX idx_notifications_user_read_time (user_id, is_read, created_at),
+    INDEX idx_notifications_user_time (user_id, created_at, id)
 );
 
 -- 3. DATA SEEDING (Run once to populate the UI for testing)
@@ -80,6 +153,12 @@ INSERT INTO moisture_readings (plant_id, moisture_level, pump_status, is_automat
 (3, 42.00, TRUE,  FALSE, NOW() - INTERVAL 5 HOUR),
 (4, 28.50, FALSE, FALSE, NOW() - INTERVAL 1 HOUR);
 
+INSERT INTO plant_latest (plant_id, moisture_level, recorded_at, pump_status, pump_changed_at) VALUES
+(1, 38.40, NOW() - INTERVAL 10 HOUR, FALSE, NULL),
+(2, 34.80, NOW() - INTERVAL 24 HOUR, FALSE, NULL),
+(3, 42.00, NOW() - INTERVAL 5 HOUR, FALSE, NULL),
+(4, 28.50, NOW() - INTERVAL 1 HOUR, FALSE, NULL);
+
 -- Generate initial notifications
 INSERT INTO user_notifications (user_id, plant_id, title, message, event_type) VALUES
 (1, 1, 'Auto-Watering Success', 'Kitchen Basil was watered for 15s.', 'auto_watering'),
@@ -0,0 +1,44 @@
+-- Migration 001: latest-reading summary table and moisture_readings indexes
+-- Keeps dashboard, plant detail and AI tips off the full readings history.
+USE SmartIrrigation;
+
+-- Composite indexes for per-plant, time-ordered access to history
+CREATE INDEX idx_readings_plant_time ON moisture_readings (plant_id, recorded_at);
+
+-- Denormalized latest state per plant, maintained by the ingest writer and pump events
+CREATE TABLE IF NOT EXISTS plant_latest (
+    plant_id INT PRIMARY KEY,
+    moisture_level DECIMAL(5,2),
+    recorded_at TIMESTAMP NULL,
+    pump_status BOOLEAN DEFAULT FALSE,
+    pump_changed_at TIMESTAMP NULL,
+    FOREIGN KEY (plant_id) REFERENCES plants(id) ON DELETE CASCADE
+);
+
+-- Temporary index for the backfill's per-plant MAX(id) scans; no runtime query needs it
+CREATE INDEX idx_readings_plant_level ON moisture_readings (plant_id, moisture_level);
+
+-- Backfill from existing history: newest sensor reading per plant
+INSERT INTO plant_latest (plant_id, moisture_level, recorded_at)
+SELECT m.plant_id, m.moisture_level, m.recorded_at
+FROM moisture_readings m
+JOIN (SELECT plant_id, MAX(id) AS id
+      FROM moisture_readings
+      WHERE moisture_level IS NOT NULL
+      GROUP BY plant_id) newest ON newest.id = m.id
+ON DUPLICATE KEY UPDATE moisture_level = VALUES(moisture_level),
+                        recorded_at = VALUES(recorded_at);
+
+-- Backfill newest pump event per plant (pump rows carry no moisture level)
+INSERT INTO plant_latest (plant_id, pump_status, pump_changed_at)
+SELECT m.plant_id, m.pump_status, m.recorded_at
+FROM moisture_readings m
+JOIN (SELECT plant_id, MAX(id) AS id
+      FROM moisture_readings
+      WHERE moisture_level IS NULL
+      GROUP BY plant_id) newest ON newest.id = m.id
+ON DUPLICATE KEY UPDATE pump_status = VALUES(pump_status),
+                        pump_changed_at = VALUES(pump_changed_at);
+
+-- Backfill done; drop the temporary index so ingest does not pay for it on every insert
+DROP INDEX idx_readings_plant_level ON moisture_readings;
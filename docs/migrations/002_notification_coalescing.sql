@@ -0,0 +1,12 @@
+-- Migration 002: coalesced alert counters on user_notifications
+-- Repeated low/critical moisture alerts update one row per window instead of inserting new rows.
+USE SmartIrrigation;
+
+ALTER TABLE user_notifications
+    ADD COLUMN occurrences INT NOT NULL DEFAULT 1,
+    ADD COLUMN last_seen_at TIMESTAMP NULL;
+
+-- Event types the server already writes but the original ENUM rejected
+ALTER TABLE user_notifications
+    MODIFY event_type ENUM('low_moisture', 'critical_moisture', 'auto_watering', 'watering_complete',
+                           'manual_watering', 'manual_stop', 'threshold_update', 'system') DEFAULT 'system';
@@ -0,0 +1,7 @@
+-- Migration 003: indexes for keyset-paginated, filtered notification listing
+USE SmartIrrigation;
+
+-- Unread/read filtered pages and unread counts
+CREATE INDEX idx_notifications_user_read_time ON user_notifications (user_id, is_read, created_at);
+-- Unfiltered pages ordered by (created_at, id)
+CREATE INDEX idx_notifications_user_time ON user_notifications (user_id, created_at, id);
@@ -0,0 +1,51 @@
+-- Migration 004: minute/hour/day rollups of moisture_readings for the retention job
+-- Raw readings are kept for RETENTION_RAW_DAYS; history beyond that comes from these tables.
+USE SmartIrrigation;
+
+-- Time-ordered access for chunked deletes and the first rollup pass
+CREATE INDEX idx_readings_time ON moisture_readings (recorded_at);
+
+CREATE TABLE IF NOT EXISTS moisture_rollup_minute (
+    plant_id INT NOT NULL,
+    bucket_start DATETIME NOT NULL,
+    min_level DECIMAL(5,2) NULL,
+    max_level DECIMAL(5,2) NULL,
+    avg_level DECIMAL(7,3) NULL,
+    sample_count INT NOT NULL DEFAULT 0,
+    pump_on_seconds DECIMAL(9,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (plant_id, bucket_start),
+    INDEX idx_rollup_minute_time (bucket_start),
+    FOREIGN KEY (plant_id) REFERENCES plants(id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS moisture_rollup_hour (
+    plant_id INT NOT NULL,
+    bucket_start DATETIME NOT NULL,
+    min_level DECIMAL(5,2) NULL,
+    max_level DECIMAL(5,2) NULL,
+    avg_level DECIMAL(7,3) NULL,
+    sample_count INT NOT NULL DEFAULT 0,
+    pump_on_seconds DECIMAL(11,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (plant_id, bucket_start),
+    INDEX idx_rollup_hour_time (bucket_start),
+    FOREIGN KEY (plant_id) REFERENCES plants(id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS moisture_rollup_day (
+    plant_id INT NOT NULL,
+    bucket_start DATETIME NOT NULL,
+    min_level DECIMAL(5,2) NULL,
+    max_level DECIMAL(5,2) NULL,
+    avg_level DECIMAL(7,3) NULL,
+    sample_count INT NOT NULL DEFAULT 0,
+    pump_on_seconds DECIMAL(11,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (plant_id, bucket_start),
+    INDEX idx_rollup_day_time (bucket_start),
+    FOREIGN KEY (plant_id) REFERENCES plants(id) ON DELETE CASCADE
+);
+
+-- Rollup watermark, so a restart resumes instead of re-rolling all history
+CREATE TABLE IF NOT EXISTS retention_state (
+    name VARCHAR(32) PRIMARY KEY,
+    rolled_until DATETIME NOT NULL
+);
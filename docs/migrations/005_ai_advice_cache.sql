@@ -0,0 +1,12 @@
+-- Migration 005: durable cache of AI care advice
+-- Keyed by sha256 of (plant name, location, environment_desc, moisture band).
+USE SmartIrrigation;
+
+CREATE TABLE IF NOT EXISTS ai_advice_cache (
+    cache_key CHAR(64) PRIMARY KEY,
+    plant_id INT NULL,
+    advice TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_advice_created (created_at),
+    FOREIGN KEY (plant_id) REFERENCES plants(id) ON DELETE CASCADE
+);
@@ -1,4 +1,11 @@
+import collections
+import math
 import os
+import queue
+import selectors
+import sqlite3
+import statistics
+import threading
 import serial
 import serial.tools.list_ports
 import time
@@ -12,6 +19,59 @@ load_dotenv()
 # CONFIGURATION: Unique ID for this hardware setup
 HARDWARE_ID = os.getenv('HARDWARE_ID', 'DEFAULT_NODE')
 
+# Print every frame and publish (off by default; a reading arrives every ~2 s)
+VERBOSE = os.getenv('BRIDGE_VERBOSE', '0') == '1'
+# Readings buffered between the serial reader and the publisher
+QUEUE_SIZE = int(os.getenv('BRIDGE_QUEUE_SIZE', 1000))
+STATS_INTERVAL = int(os.getenv('BRIDGE_STATS_SECONDS', 60))
+
+# "single" serves one port as HARDWARE_ID; "multi" serves every matching port in one process
+BRIDGE_MODE = os.getenv('BRIDGE_MODE', 'single')
+# Port -> hardware_id for multi mode, by device path or USB serial number:
+# HARDWARE_ID_MAP="/dev/ttyUSB0=RACK1_A,SN:85735313=RACK1_B"
+HARDWARE_ID_MAP = os.getenv('HARDWARE_ID_MAP', '')
+RESCAN_SECONDS = float(os.getenv('BRIDGE_RESCAN_SECONDS', 5))
+BAUD_RATE = 9600
+
+# Report-on-change filtering per sensor (see ReportFilter). A smoothed value is
+# published when its median moves BRIDGE_DEADBAND points (0 publishes every reading),
+# crosses a reporting threshold, or after BRIDGE_HEARTBEAT_SECONDS of silence
+DEADBAND = float(os.getenv('BRIDGE_DEADBAND', 1.0))
+HEARTBEAT_SECONDS = float(os.getenv('BRIDGE_HEARTBEAT_SECONDS', 300))
+MEDIAN_WINDOW = int(os.getenv('BRIDGE_MEDIAN_WINDOW', 5))
+EMA_ALPHA = float(os.getenv('BRIDGE_EMA_ALPHA', 0.3))
+# A jump this far from the recent median is a spike unless OUTLIER_CONFIRM readings in a row agree
+OUTLIER_JUMP = float(os.getenv('BRIDGE_OUTLIER_JUMP', 25))
+OUTLIER_CONFIRM = int(os.getenv('BRIDGE_OUTLIER_CONFIRM', 3))
+# Levels reported the moment they are crossed: 20 is the server's critical-moisture alert
+# and 30 the default plants.moisture_threshold that starts auto-watering
+REPORT_THRESHOLDS = [float(t) for t in os.getenv('REPORT_THRESHOLDS', '20,30').split(',') if t.strip()]
+# Extra level per sensor for plants with their own moisture_threshold:
+# REPORT_THRESHOLDS_BY_ID="RACK1_A=35,RACK1_B=25"
+REPORT_THRESHOLDS_BY_ID = os.getenv('REPORT_THRESHOLDS_BY_ID', '')
+
+# Readings are published in envelopes of up to BATCH_SIZE, sent once full or
+# BATCH_LINGER_MS after the first reading; 50 rows stay far below PubNub's 32 KiB limit
+BATCH_SIZE = int(os.getenv('BRIDGE_BATCH_SIZE', 50))
+BATCH_LINGER = float(os.getenv('BRIDGE_BATCH_LINGER_MS', 1000)) / 1000
+# Publish requests allowed on the wire at once; the collector waits beyond that
+MAX_IN_FLIGHT = int(os.getenv('BRIDGE_MAX_IN_FLIGHT', 4))
+
+# Every reading is written to this SQLite spool before publishing and deleted once
+# PubNub acknowledges it, so a network outage leaves a backlog instead of a gap
+SPOOL_PATH = os.getenv('BRIDGE_SPOOL_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bridge_spool.db'))
+# Oldest readings are evicted beyond this (~1 week of one sensor at one reading per 2 s)
+SPOOL_MAX_ROWS = int(os.getenv('BRIDGE_SPOOL_MAX_ROWS', 300000))
+# Readings older than this are evicted too; keep it at or below the server's INGEST_MAX_READING_AGE_SECONDS,
+# which drops anything older on arrival
+SPOOL_MAX_AGE = float(os.getenv('BRIDGE_SPOOL_MAX_AGE_SECONDS', 7 * 86400))
+# Backlog is sent in larger envelopes than live data while catching up
+DRAIN_BATCH_SIZE = int(os.getenv('BRIDGE_DRAIN_BATCH_SIZE', 250))
+# While PubNub is unreachable, one backlog envelope is retried this often
+RETRY_SECONDS = float(os.getenv('BRIDGE_RETRY_SECONDS', 5))
+# A publish not acknowledged within this long is made available for resending
+LEASE_SECONDS = 60
+
 # PubNub Setup
 pn_config = PNConfiguration()
 pn_config.subscribe_key = os.getenv('PUBNUB_SUBSCRIBE_KEY')
@@ -20,81 +80,693 @@ pn_config.user_id = f"bridge_{HARDWARE_ID}"
 pubnub = PubNub(pn_config)
 
 
-def find_arduino_port():
-    """Try to automatically find the Arduino port"""
-    ports = list(serial.tools.list_ports.comports())
+# Common Arduino descriptions to look for
+ARDUINO_KEYWORDS = ['arduino', 'ch340', 'usb serial', 'usb uart']
 
-    # Common Arduino descriptions to look for
-    arduino_keywords = ['arduino', 'ch340', 'usb serial', 'usb uart']
 
-    for port in ports:
-        port_desc = port.description.lower()
-        for keyword in arduino_keywords:
-            if keyword in port_desc:
-                print(f"Found Arduino on {port.device}: {port.description}")
-                return port.device
+def find_arduino_ports(id_map=None):
+    """Every serial port whose description looks like an Arduino, plus any mapped in ``id_map``"""
+    id_map = id_map or {}
+    return [port for port in serial.tools.list_ports.comports()
+            if any(keyword in port.description.lower() for keyword in ARDUINO_KEYWORDS)
+            or port.device in id_map or f"SN:{port.serial_number}" in id_map]
+
+
+def find_arduino_port():
+    """Try to automatically find the Arduino port"""
+    ports = find_arduino_ports()
+    if ports:
+        print(f"Found Arduino on {ports[0].device}: {ports[0].description}")
+        return ports[0].device
 
     # If no Arduino found, list available ports
     print("No Arduino found. Available ports:")
-    for port in ports:
+    for port in serial.tools.list_ports.comports():
         print(f"  - {port.device}: {port.description}")
 
     return None
 
 
-# Try to find Arduino port
-arduino_port = find_arduino_port()
+def parse_id_map(spec):
+    """Parse ``"<device or SN:serial>=<hardware_id>,..."`` into a dict"""
+    mapping = {}
+    for part in spec.split(","):
+        if "=" in part:
+            key, hardware_id = part.split("=", 1)
+            mapping[key.strip()] = hardware_id.strip()
+    return mapping
+
+
+def thresholds_for(hardware_id, by_id=None):
+    """REPORT_THRESHOLDS plus the level configured for ``hardware_id`` in REPORT_THRESHOLDS_BY_ID"""
+    by_id = parse_id_map(REPORT_THRESHOLDS_BY_ID) if by_id is None else by_id
+    levels = list(REPORT_THRESHOLDS)
+    try:
+        if hardware_id in by_id:
+            levels.append(float(by_id[hardware_id]))
+    except ValueError:
+        print(f"Ignoring invalid reporting threshold for {hardware_id}: {by_id[hardware_id]}")
+    return sorted(set(levels))
 
-if not arduino_port:
-    print("Could not auto-detect Arduino. Please enter COM port manually:")
-    arduino_port = input("Enter COM port (e.g., COM3, COM4): ").strip()
 
-try:
-    # Try to connect to Arduino
-    print(f"Connecting to {arduino_port} at 9600 baud...")
-    ser = serial.Serial(arduino_port, 9600, timeout=1)
-    time.sleep(2)  # Wait for Arduino to reset
-    print(f"Connected to {arduino_port}")
+def resolve_hardware_id(port_info, id_map):
+    """(hardware_id, pinned) for a port: configured mapping first, else a provisional id.
 
-except Exception as e:
-    print(f"Failed to connect to {arduino_port}: {e}")
-    print("Please check:")
-    print("1. Arduino is connected via USB")
-    print("2. Correct COM port is selected")
-    print("3. No other program is using the port (close Arduino IDE)")
-    exit(1)
+    Unpinned ports adopt the id the device reports with an ``ID:<hardware_id>`` line.
+    """
+    for key in (port_info.device, f"SN:{port_info.serial_number}" if port_info.serial_number else None):
+        if key and key in id_map:
+            return id_map[key], True
+    return f"{HARDWARE_ID}_{os.path.basename(port_info.device)}", False
 
-print(f"--- Moisture Bridge Active: {HARDWARE_ID} ---")
-print("Listening for moisture data...")
 
-while True:
-    if ser.in_waiting > 0:
+def parse_frame(line):
+    """Parse one sensor line into {"moisture", "status"}, or None if it isn't a reading.
+
+    Accepts the sketch's ``MOISTURE:<pct>`` and the extended
+    ``MOISTURE:<pct>:<raw>:<status>`` frame. Banner and ``RAW:`` lines are ignored.
+    """
+    if not line.startswith("MOISTURE:"):
+        return None
+    parts = line.split(":")
+    try:
+        moisture = float(parts[1])
+    except (IndexError, ValueError):
+        return None
+    return {"moisture": moisture, "status": parts[3] if len(parts) >= 4 else None}
+
+
+def put_latest(readings, frame):
+    """Queue ``frame``, evicting the oldest reading if full. Returns True if one was dropped."""
+    dropped = False
+    while True:
         try:
-            line = ser.readline().decode('utf-8').strip()
-            print(f"Raw data: {line}")  # Debug
-
-            if line.startswith("MOISTURE:"):
-                parts = line.split(":")
-
-                if len(parts) >= 4:
-                    data = {
-                        "hardware_id": HARDWARE_ID,
-                        "moisture": float(parts[1]),
-                        "status": parts[3],
-                        "timestamp": time.time()
-                    }
-
-                    try:
-                        pubnub.publish().channel("moisture-data").message(data).sync()
-                        print(f"Published telemetry for {HARDWARE_ID}: {parts[1]}% ({parts[3]})")
-                    except Exception as pubnub_error:
-                        print(f"PubNub error: {pubnub_error}")
-                else:
-                    print(f"Malformed data: {line}")
+            readings.put_nowait(frame)
+            return dropped
+        except queue.Full:
+            try:
+                readings.get_nowait()
+                dropped = True
+            except queue.Empty:
+                pass
+
+
+class ReportFilter:
+    """Decides which readings from one sensor are worth publishing.
+
+    Each raw value is checked against the median of the last ``window``
+    readings. A jump of more than ``outlier_jump`` points is dropped as a
+    spike unless ``outlier_confirm`` readings in a row agree, so a loose
+    wire is ignored but a pot being watered is not. Accepted values are
+    median- then EMA-smoothed, and the EMA is kept within ``deadband`` of
+    the median so it never lags a real trend by more than that. A value is
+    reported when the median moves ``deadband`` points from the median at
+    the last report, when the frame status changes, or after ``heartbeat``
+    seconds so the server can tell a steady sensor from a dead one. Crossing
+    one of ``thresholds`` is judged on the screened raw value against the
+    last published one and reported at once with the raw value; smoothing
+    then restarts from it so the next report stays on the new side.
+    """
+
+    def __init__(self, deadband=DEADBAND, heartbeat=HEARTBEAT_SECONDS, window=MEDIAN_WINDOW, alpha=EMA_ALPHA,
+                 outlier_jump=OUTLIER_JUMP, outlier_confirm=OUTLIER_CONFIRM, thresholds=REPORT_THRESHOLDS):
+        self.deadband = deadband
+        self.heartbeat = heartbeat
+        self.alpha = alpha
+        self.outlier_jump = outlier_jump
+        self.outlier_confirm = outlier_confirm
+        self.thresholds = thresholds
+        self.recent = collections.deque(maxlen=max(1, window))
+        self.suspect = []
+        self.ema = None
+        self.last_value = None
+        self.last_median = None
+        self.last_status = None
+        self.last_report = 0.0
+        self.rejected = 0
+        self.suppressed = 0
+
+    def update(self, moisture, status=None, now=None):
+        """The value to publish for this reading, or None to suppress it."""
+        now = time.monotonic() if now is None else now
+        if self.recent and self.outlier_jump and abs(moisture - statistics.median(self.recent)) > self.outlier_jump:
+            self.suspect.append(moisture)
+            if len(self.suspect) < self.outlier_confirm:
+                self.rejected += 1
+                return None
+            # A sustained jump is a real change; restart smoothing from it
+            self.recent.clear()
+            self.recent.extend(self.suspect)
+            self.ema = None
+        else:
+            self.recent.append(moisture)
+        self.suspect = []
+
+        crossed = self.last_value is not None and any(
+            (self.last_value < level) != (moisture < level) for level in self.thresholds)
+        if crossed:
+            # Median and EMA both trail a steady trend; restart them at the crossing reading
+            self.recent.clear()
+            self.recent.append(moisture)
+            self.ema = moisture
+
+        median = statistics.median(self.recent)
+        self.ema = median if self.ema is None else self.alpha * median + (1 - self.alpha) * self.ema
+        if self.deadband and abs(self.ema - median) > self.deadband:
+            self.ema = median + math.copysign(self.deadband, self.ema - median)
+        value = round(moisture if crossed else self.ema, 1)
+
+        if (self.last_median is None or crossed or status != self.last_status
+                or abs(median - self.last_median) >= self.deadband
+                or now - self.last_report >= self.heartbeat):
+            self.last_value = value
+            self.last_median = median
+            self.last_status = status
+            self.last_report = now
+            return value
+        self.suppressed += 1
+        return None
+
+
+class PortState:
+    """Line framing and identity for one open serial port."""
 
+    def __init__(self, ser, device, hardware_id, pinned=True):
+        self.ser = ser
+        self.device = device
+        self.hardware_id = hardware_id
+        self.pinned = pinned
+        self.buffer = b""
+        self.lines = 0
+        self.parsed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.filter = ReportFilter(thresholds=thresholds_for(hardware_id))
+
+    def feed(self, chunk, readings):
+        """Split raw bytes from a non-blocking read into lines."""
+        self.buffer += chunk
+        while b"\n" in self.buffer:
+            raw, self.buffer = self.buffer.split(b"\n", 1)
+            self.handle_line(raw, readings)
+
+    def handle_line(self, raw, readings):
+        self.lines += 1
+        try:
+            line = raw.decode('utf-8').strip()
         except UnicodeDecodeError:
-            print("Could not decode serial data (check baud rate)")
-        except Exception as e:
-            print(f"Error: {e}")
+            self.errors += 1
+            return
+        if VERBOSE:
+            print(f"Raw data ({self.device}): {line}")
+
+        if line.startswith("ID:"):
+            reported = line[3:].strip()
+            if reported and not self.pinned and reported != self.hardware_id:
+                print(f"{self.device} reports hardware id {reported}")
+                self.hardware_id = reported
+                self.filter.thresholds = thresholds_for(reported)
+            return
+
+        frame = parse_frame(line)
+        if frame is None:
+            return
+        self.parsed += 1
+        moisture = self.filter.update(frame["moisture"], frame["status"])
+        if moisture is None:
+            return
+        frame["moisture"] = moisture
+        frame["hardware_id"] = self.hardware_id
+        frame["timestamp"] = time.time()
+        if put_latest(readings, frame):
+            self.dropped += 1
+
+    def stats(self):
+        return {"lines": self.lines, "readings": self.parsed, "suppressed": self.filter.suppressed,
+                "rejected": self.filter.rejected, "dropped": self.dropped, "errors": self.errors}
+
+
+class SerialReader(threading.Thread):
+    """Reads framed lines from one serial port as they arrive and queues parsed readings.
+
+    ``readline`` blocks in the driver until a full line or the port timeout,
+    so readings are picked up at line rate and the thread sleeps while the
+    sensor is quiet. When the queue is full the oldest reading is dropped so
+    the publisher always sees current data.
+    """
+
+    def __init__(self, port, readings):
+        super().__init__(name=f"serial-reader-{port.device}", daemon=True)
+        self.port = port
+        self.readings = readings
+        self.running = True
+
+    def run(self):
+        while self.running:
+            try:
+                raw = self.port.ser.readline()
+            except (serial.SerialException, OSError) as e:
+                print(f"Serial read failed on {self.port.device}: {e}")
+                break
+            if raw:
+                self.port.handle_line(raw, self.readings)
+        self.running = False
+
+    def stats(self):
+        return self.port.stats()
+
+
+class MultiPortReader(threading.Thread):
+    """Serves every Arduino port on the host from one process, with hot-plug.
+
+    Ports are rediscovered every ``rescan_seconds``: new devices are opened
+    and removed ones closed. On POSIX one thread multiplexes all ports with
+    ``selectors``; Windows serial handles can't be selected, so there each
+    port gets its own blocking SerialReader.
+    """
+
+    def __init__(self, readings, id_map, rescan_seconds=RESCAN_SECONDS):
+        super().__init__(name="multi-port-reader", daemon=True)
+        self.readings = readings
+        self.id_map = id_map
+        self.rescan_seconds = rescan_seconds
+        self.running = True
+        self.use_selector = os.name != 'nt'
+        self.selector = selectors.DefaultSelector() if self.use_selector else None
+        self.ports = {}
+        self.threads = {}
+        self.retired = {"lines": 0, "readings": 0, "suppressed": 0, "rejected": 0, "dropped": 0, "errors": 0}
+
+    def run(self):
+        next_scan = 0
+        while self.running:
+            now = time.monotonic()
+            if now >= next_scan:
+                self._rescan()
+                next_scan = now + self.rescan_seconds
+            timeout = max(0.0, next_scan - time.monotonic())
+
+            if not self.use_selector:
+                time.sleep(timeout)
+                continue
+            for key, _ in self.selector.select(timeout):
+                self._read(key.data)
+
+        for port in list(self.ports.values()):
+            self._close(port, "bridge stopping")
+
+    def _read(self, port):
+        try:
+            chunk = port.ser.read(port.ser.in_waiting or 1)
+        except (serial.SerialException, OSError) as e:
+            self._close(port, e)
+            return
+        if chunk:
+            port.feed(chunk, self.readings)
+
+    def _rescan(self):
+        found = {info.device: info for info in find_arduino_ports(self.id_map)}
+
+        for device, port in list(self.ports.items()):
+            reader = self.threads.get(device)
+            if device not in found:
+                self._close(port, "unplugged")
+            elif reader and not reader.is_alive():
+                self._close(port, "reader stopped")
+
+        for device, info in found.items():
+            if device in self.ports:
+                continue
+            try:
+                # Non-blocking reads under the selector; blocking readline in per-port threads
+                ser = serial.Serial(device, BAUD_RATE, timeout=0 if self.use_selector else 1)
+            except (serial.SerialException, OSError) as e:
+                print(f"Could not open {device}: {e}")
+                continue
+
+            hardware_id, pinned = resolve_hardware_id(info, self.id_map)
+            port = PortState(ser, device, hardware_id, pinned)
+            self.ports[device] = port
+            if self.use_selector:
+                self.selector.register(ser.fileno(), selectors.EVENT_READ, port)
+            else:
+                self.threads[device] = SerialReader(port, self.readings)
+                self.threads[device].start()
+            print(f"Attached {device} ({info.description}) as {hardware_id}")
+
+    def _close(self, port, reason):
+        self.ports.pop(port.device, None)
+        reader = self.threads.pop(port.device, None)
+        if reader:
+            reader.running = False
+        if self.use_selector:
+            try:
+                self.selector.unregister(port.ser.fileno())
+            except (KeyError, ValueError, OSError):
+                pass
+        try:
+            port.ser.close()
+        except Exception:
+            pass
+        for key, value in port.stats().items():
+            self.retired[key] += value
+        print(f"Detached {port.device} ({port.hardware_id}): {reason}")
+
+    def stats(self):
+        totals = dict(self.retired)
+        for port in list(self.ports.values()):
+            for key, value in port.stats().items():
+                totals[key] += value
+        totals["ports"] = len(self.ports)
+        return totals
+
+
+def next_batch(readings, max_size=BATCH_SIZE, linger=BATCH_LINGER):
+    """Wait up to a second for a reading, then collect more until ``max_size`` or ``linger`` elapses."""
+    try:
+        batch = [readings.get(timeout=1)]
+    except queue.Empty:
+        return []
+
+    deadline = time.monotonic() + linger
+    while len(batch) < max_size:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            batch.append(readings.get(timeout=remaining))
+        except queue.Empty:
+            break
+    return batch
+
+
+def build_envelope(frames):
+    """Compact wire format: ``{"v": 1, "batch": {hardware_id: [[timestamp, moisture, status], ...]}}``.
+
+    Field names and the hardware id are sent once per envelope instead of once per reading.
+    """
+    batch = {}
+    for frame in frames:
+        row = [round(frame["timestamp"], 2), frame["moisture"]]
+        if frame.get("status") is not None:
+            row.append(frame["status"])
+        batch.setdefault(frame["hardware_id"], []).append(row)
+    return {"v": 1, "batch": batch}
+
+
+class Spool:
+    """Append-only SQLite store (WAL mode) for readings PubNub hasn't acknowledged yet.
+
+    Rows being published are leased so the backlog drain doesn't send them
+    twice; an ack deletes them, a failure or an expired lease returns them
+    to the backlog. Beyond ``max_rows``, or once older than ``max_age``
+    seconds, the oldest rows are evicted. Delivery
+    is at-least-once: a publish that succeeded but timed out is resent.
+    Called from the main thread and PubNub's callback threads.
+    """
+
+    def __init__(self, path=SPOOL_PATH, max_rows=SPOOL_MAX_ROWS, max_age=SPOOL_MAX_AGE):
+        self.path = path
+        self.max_rows = max_rows
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS readings (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    hardware_id TEXT NOT NULL,
+                    ts REAL NOT NULL,
+                    moisture REAL NOT NULL,
+                    status TEXT,
+                    leased_until REAL NOT NULL DEFAULT 0
+                )""")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_readings_ts ON readings (ts)")
+            # Leases from a previous run are void
+            self.conn.execute("UPDATE readings SET leased_until = 0 WHERE leased_until > 0")
+        self.rows = self.conn.execute("SELECT COUNT(*) FROM readings").fetchone()[0]
+        self.evicted = 0
+        if self.rows:
+            print(f"Spool {path} holds {self.rows} unsent readings")
+
+    def append(self, frames, lease=False):
+        """Store ``frames`` durably and return their row ids, leased if they are about to be published."""
+        leased_until = time.time() + LEASE_SECONDS if lease else 0
+        with self.lock, self.conn:
+            ids = []
+            for frame in frames:
+                cur = self.conn.execute(
+                    "INSERT INTO readings (hardware_id, ts, moisture, status, leased_until) VALUES (?, ?, ?, ?, ?)",
+                    (frame["hardware_id"], frame["timestamp"], frame["moisture"], frame.get("status"), leased_until))
+                ids.append(cur.lastrowid)
+            self.rows += len(ids)
+            self._evict()
+        return ids
+
+    def _evict(self):
+        excess = self.rows - self.max_rows
+        if excess > 0:
+            cur = self.conn.execute(
+                "DELETE FROM readings WHERE id IN (SELECT id FROM readings ORDER BY id LIMIT ?)", (excess,))
+            self.rows -= cur.rowcount
+            self.evicted += cur.rowcount
+
+    def _evict_expired(self):
+        # The server drops readings this old, so sending them only wastes the drain
+        if self.max_age:
+            cur = self.conn.execute("DELETE FROM readings WHERE ts < ?", (time.time() - self.max_age,))
+            self.rows -= cur.rowcount
+            self.evicted += cur.rowcount
+
+    def lease(self, limit):
+        """Lease up to ``limit`` of the oldest unleased readings: ``(ids, frames)``."""
+        with self.lock, self.conn:
+            self._evict_expired()
+            rows = self.conn.execute(
+                "SELECT id, hardware_id, ts, moisture, status FROM readings "
+                "WHERE leased_until < ? ORDER BY id LIMIT ?", (time.time(), limit)).fetchall()
+            ids = [row[0] for row in rows]
+            self.conn.executemany("UPDATE readings SET leased_until = ? WHERE id = ?",
+                                  [(time.time() + LEASE_SECONDS, row_id) for row_id in ids])
+        frames = [{"hardware_id": hardware_id, "timestamp": ts, "moisture": moisture, "status": status}
+                  for _, hardware_id, ts, moisture, status in rows]
+        return ids, frames
+
+    def ack(self, ids):
+        with self.lock:
+            if self.conn is None:
+                return  # a late callback after close; the rows are resent next run
+            with self.conn:
+                cur = self.conn.executemany("DELETE FROM readings WHERE id = ?", [(row_id,) for row_id in ids])
+                self.rows -= cur.rowcount
+
+    def release(self, ids):
+        with self.lock:
+            if self.conn is None:
+                return
+            with self.conn:
+                self.conn.executemany("UPDATE readings SET leased_until = 0 WHERE id = ?",
+                                      [(row_id,) for row_id in ids])
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+            self.conn = None
+
+    def stats(self):
+        return {"spooled": self.rows, "evicted": self.evicted}
+
+
+class AsyncPublisher:
+    """Publishes spooled envelopes without waiting for each HTTPS round trip.
+
+    At most ``max_in_flight`` publishes are outstanding. Live batches never
+    wait for a slot: without one they stay in the spool as backlog. The
+    backlog is drained in DRAIN_BATCH_SIZE envelopes on every slot but one,
+    which is kept for live data so catch-up never delays current readings.
+    While PubNub is failing only one backlog envelope per RETRY_SECONDS is
+    tried; the first success switches back to full-speed draining.
+    """
+
+    def __init__(self, spool, channel="moisture-data", max_in_flight=MAX_IN_FLIGHT):
+        self.spool = spool
+        self.channel = channel
+        self.max_in_flight = max_in_flight
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.online = True
+        self.last_retry = 0.0
+        self.envelopes = 0
+        self.published = 0
+        self.failed = 0
+        self.backlog_sent = 0
+
+    def _acquire(self, reserve=0):
+        with self.lock:
+            if self.in_flight + reserve >= self.max_in_flight:
+                return False
+            self.in_flight += 1
+            return True
+
+    def publish_live(self, frames):
+        """Spool a fresh batch and publish it right away if a slot is free."""
+        leased = self._acquire()
+        ids = self.spool.append(frames, lease=leased)
+        if leased:
+            self._send(ids, frames)
+
+    def drain_backlog(self):
+        """Send spooled backlog: accelerated while online, one probe per RETRY_SECONDS while not."""
+        if not self.online:
+            if time.monotonic() - self.last_retry < RETRY_SECONDS or not self._acquire():
+                return
+            self.last_retry = time.monotonic()
+            self._send_backlog()
+            return
+
+        while self.online and self._acquire(reserve=1):
+            if not self._send_backlog():
+                break
+
+    def _send_backlog(self):
+        ids, frames = self.spool.lease(DRAIN_BATCH_SIZE)
+        if not ids:
+            with self.lock:
+                self.in_flight -= 1
+            return False
+        with self.lock:
+            self.backlog_sent += len(ids)
+        self._send(ids, frames)
+        return True
+
+    def _send(self, ids, frames):
+        count = len(frames)
+
+        def done(result, status):
+            if status.is_error():
+                self._finish(ids, False)
+                reason = status.error_data.information if status.error_data else status.category
+                print(f"PubNub error ({count} readings spooled): {reason}")
+            else:
+                self._finish(ids, True)
+                if VERBOSE:
+                    print(f"Published {count} readings")
+
+        try:
+            pubnub.publish().channel(self.channel).message(build_envelope(frames)).pn_async(done)
+        except Exception as pubnub_error:
+            self._finish(ids, False)
+            print(f"PubNub error ({count} readings spooled): {pubnub_error}")
+
+    def _finish(self, ids, ok):
+        if ok:
+            self.spool.ack(ids)
+        else:
+            self.spool.release(ids)
+        with self.lock:
+            self.in_flight -= 1
+            if ok:
+                if not self.online:
+                    print("PubNub reachable again; draining spooled readings")
+                self.envelopes += 1
+                self.published += len(ids)
+            else:
+                if self.online:
+                    self.last_retry = time.monotonic()
+                self.failed += len(ids)
+            self.online = ok
+
+    def drain(self, timeout=10):
+        """Wait for outstanding publishes to finish, e.g. before exiting; the rest stays spooled."""
+        deadline = time.monotonic() + timeout
+        while self.in_flight and time.monotonic() < deadline:
+            time.sleep(0.1)
+
+    def stats(self):
+        with self.lock:
+            return {"envelopes": self.envelopes, "published": self.published, "failed": self.failed,
+                    "backlog_sent": self.backlog_sent, "online": self.online}
+
+
+def publish_readings(reader, readings):
+    """Batch, spool and publish queued readings until the reader stops; runs on the main thread."""
+    spool = Spool()
+    publisher = AsyncPublisher(spool)
+    last_stats = time.monotonic()
+    try:
+        while reader.is_alive() or not readings.empty():
+            frames = next_batch(readings)
+            if frames:
+                publisher.publish_live(frames)
+            publisher.drain_backlog()
+
+            if time.monotonic() - last_stats >= STATS_INTERVAL:
+                last_stats = time.monotonic()
+                stats = {**reader.stats(), **publisher.stats(), **spool.stats()}
+                print(f"[bridge] {' '.join(f'{key}={value}' for key, value in stats.items())} "
+                      f"queued={readings.qsize()}")
+    finally:
+        publisher.drain()
+        spool.close()
+
+
+def run_multi():
+    readings = queue.Queue(maxsize=QUEUE_SIZE)
+    reader = MultiPortReader(readings, parse_id_map(HARDWARE_ID_MAP))
+    print(f"--- Moisture Bridge Active: multi-port, rescanning every {RESCAN_SECONDS:g}s ---")
+    reader.start()
+    try:
+        publish_readings(reader, readings)
+    except KeyboardInterrupt:
+        print("Stopping bridge...")
+    finally:
+        reader.running = False
+        reader.join(RESCAN_SECONDS + 1)
+
+
+def main():
+    if BRIDGE_MODE == 'multi':
+        run_multi()
+        return
+
+    # Try to find Arduino port
+    arduino_port = find_arduino_port()
+
+    if not arduino_port:
+        print("Could not auto-detect Arduino. Please enter COM port manually:")
+        arduino_port = input("Enter COM port (e.g., COM3, COM4): ").strip()
+
+    try:
+        # Try to connect to Arduino
+        print(f"Connecting to {arduino_port} at 9600 baud...")
+        ser = serial.Serial(arduino_port, BAUD_RATE, timeout=1)
+        time.sleep(2)  # Wait for Arduino to reset
+        print(f"Connected to {arduino_port}")
+
+    except Exception as e:
+        print(f"Failed to connect to {arduino_port}: {e}")
+        print("Please check:")
+        print("1. Arduino is connected via USB")
+        print("2. Correct COM port is selected")
+        print("3. No other program is using the port (close Arduino IDE)")
+        exit(1)
+
+    print(f"--- Moisture Bridge Active: {HARDWARE_ID} ---")
+    print("Listening for moisture data...")
+
+    readings = queue.Queue(maxsize=QUEUE_SIZE)
+    reader = SerialReader(PortState(ser, arduino_port, HARDWARE_ID), readings)
+    reader.start()
+    try:
+        publish_readings(reader, readings)
+    except KeyboardInterrupt:
+        print("Stopping bridge...")
+    finally:
+        reader.running = False
+        ser.close()
+
 
-    time.sleep(0.1)
\ No newline at end of file
+if __name__ == "__main__":
+    main()